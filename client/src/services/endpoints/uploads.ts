@@ -6,16 +6,17 @@ import { Upload } from "../../types";
 export async function uploadFile(file: File, options: ApiOptions = {}): Promise<{ upload: Upload }> {
   const { token, organizationId } = options;
   
-  const formData = new FormData();
-  formData.append("file", file);
-
-  const headers: Record<string, string> = {};
+  // Send the raw file so the server can stream it straight to disk
+  const headers: Record<string, string> = {
+    "Content-Type": "application/octet-stream",
+    "X-Filename": encodeURIComponent(file.name),
+  };
   if (token) headers["Authorization"] = `Bearer ${token}`;
   if (organizationId) headers["X-Organization-Id"] = String(organizationId);
 
   const response = await apiFetch("/api/upload", {
     method: "POST",
-    body: formData,
+    body: file,
     headers,
   });
 
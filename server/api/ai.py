@@ -1,14 +1,23 @@
 # server/api/ai.py
 import os
 import time
+from typing import Optional, List, Dict
 
 # Get Groq API key (accepts both variable names for flexibility)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY") or os.getenv("AI_API_KEY")
 
-def call_groq_chat(prompt: str) -> str:
+def _build_messages(prompt: str, system: Optional[str]) -> List[Dict]:
+    """Chat messages with the optional system prelude ahead of the user turn"""
+    messages = [{"role": "user", "content": prompt}]
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
+    return messages
+
+def call_groq_chat(prompt: str, system: Optional[str] = None) -> str:
     """
     Uses Groq API for fast inference
     Requires: pip install groq
+    A fixed system message goes first so its prefix can be cached across calls.
     """
     try:
         from groq import Groq
@@ -22,12 +31,7 @@ def call_groq_chat(prompt: str) -> str:
             # "llama-3.1-8b-instant" - Faster, smaller
             # "mixtral-8x7b-32768" - Good balance
             # "gemma2-9b-it" - Efficient
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+            messages=_build_messages(prompt, system),
             max_tokens=1024,
             temperature=0.7,
             top_p=1,
@@ -46,14 +50,14 @@ def call_groq_chat(prompt: str) -> str:
         raise
 
 
-def call_ai(prompt: str) -> str:
+def call_ai(prompt: str, system: Optional[str] = None) -> str:
     """
     Top-level AI call used by the app.
     If GROQ_API_KEY is present, try Groq. On failure, fall back to mock.
     """
     if GROQ_API_KEY:
         try:
-            return call_groq_chat(prompt)
+            return call_groq_chat(prompt, system)
         except Exception as e:
             # Don't crash the app — fall back to mock and include the error for debugging
             return f"AI (fallback) — error calling Groq:\n\n{e}\n\nMock reply: {prompt[::-1]}"
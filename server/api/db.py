@@ -1,16 +1,24 @@
 # server/api/db.py - Enhanced with Organization System
 import os
+from contextlib import contextmanager
 from enum import Enum
-from sqlalchemy import create_engine, Column, Integer, Text, DateTime, String, ForeignKey, func, Boolean, Table, JSON
+from sqlalchemy import create_engine, Column, Integer, Text, DateTime, String, ForeignKey, func, Boolean, Table, JSON, Index, BigInteger
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.types import Enum as SQLEnum
 from datetime import datetime
+from flask import g, has_app_context
 
 Base = declarative_base()
 engine = None
 SessionLocal = None
 
+# Connection pool settings (ignored for SQLite, which manages its own pool)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
 
 # Enums for role-based permissions
 class OrganizationRole(Enum):
@@ -19,6 +27,12 @@ class OrganizationRole(Enum):
     MEMBER = "member"        # Can use org resources, create content
     VIEWER = "viewer"        # Read-only access
 
+# Roles allowed to manage members, invitations and settings
+MANAGER_ROLES = frozenset({OrganizationRole.OWNER, OrganizationRole.ADMIN})
+
+# Value -> member lookup for parsing request input without Enum's ValueError path
+ROLE_BY_VALUE = {role.value: role for role in OrganizationRole}
+
 class InvitationStatus(Enum):
     PENDING = "pending"
     ACCEPTED = "accepted"
@@ -40,6 +54,13 @@ user_organization_memberships = Table(
     # UniqueConstraint('user_id', 'organization_id', name='unique_user_org_membership')
 )
 
+# Partial indexes: membership lookups always filter on is_active
+_active_membership = user_organization_memberships.c.is_active == True
+Index("ix_memb_user_active", user_organization_memberships.c.user_id,
+      postgresql_where=_active_membership, sqlite_where=_active_membership)
+Index("ix_memb_org_active", user_organization_memberships.c.organization_id,
+      postgresql_where=_active_membership, sqlite_where=_active_membership)
+
 
 class User(Base):
     __tablename__ = "users"
@@ -76,27 +97,47 @@ class User(Base):
 
     def get_role_in_organization(self, org_id):
         """Get user's role in a specific organization"""
-        session = object_session(self)
-        if not session:
-            return None
+        return self.get_organization_roles().get(org_id)
+
+    def get_organization_roles(self):
+        """
+        Map organization_id -> OrganizationRole for this user.
+        Loaded once per instance, so repeated permission checks are dict lookups.
+        """
+        roles = getattr(self, "_organization_roles", None)
+        if roles is not None:
+            return roles
         
-        # Check if user is owner
-        if self.owned_organizations:
-            for org in self.owned_organizations:
-                if org.id == org_id:
-                    return OrganizationRole.OWNER
+        session = object_session(self)
+        owns_session = session is None
+        if owns_session:
+            session = get_session()
+            if not session:
+                return {}
         
-        # Check membership table
-        from sqlalchemy import and_
-        membership = session.query(user_organization_memberships).filter(
-            and_(
-                user_organization_memberships.c.user_id == self.id,
-                user_organization_memberships.c.organization_id == org_id,
-                user_organization_memberships.c.is_active == True
-            )
-        ).first()
+        try:
+            from sqlalchemy import and_
+            rows = session.query(
+                user_organization_memberships.c.organization_id,
+                user_organization_memberships.c.role
+            ).filter(
+                and_(
+                    user_organization_memberships.c.user_id == self.id,
+                    user_organization_memberships.c.is_active == True
+                )
+            ).all()
+            roles = {org_id: OrganizationRole(role) for org_id, role in rows}
+            
+            # Owners always have the owner role, even without a membership row
+            owned = session.query(Organization.id).filter(Organization.owner_id == self.id).all()
+            for (org_id,) in owned:
+                roles[org_id] = OrganizationRole.OWNER
+        finally:
+            if owns_session:
+                session.close()
         
-        return OrganizationRole(membership.role) if membership else None
+        self._organization_roles = roles
+        return roles
 
     def get_organizations(self, include_personal=True):
         """Get all organizations user belongs to"""
@@ -187,8 +228,11 @@ class Organization(Base):
         """Check if organization can add more members"""
         return self.get_member_count() < self.max_members
 
-    def to_dict(self):
-        """Convert to dictionary for JSON responses"""
+    def to_dict(self, member_count=None):
+        """
+        Convert to dictionary for JSON responses.
+        Pass member_count when it was already fetched in bulk to skip the COUNT query.
+        """
         return {
             "id": self.id,
             "name": self.name,
@@ -199,7 +243,7 @@ class Organization(Base):
             "is_personal": self.is_personal,
             "is_active": self.is_active,
             "max_members": self.max_members,
-            "member_count": self.get_member_count(),
+            "member_count": self.get_member_count() if member_count is None else member_count,
             "plan_type": self.plan_type,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
@@ -236,6 +280,11 @@ class OrganizationInvitation(Base):
     invited_by = relationship("User", foreign_keys=[invited_by_id], back_populates="sent_invitations")
     invited_user = relationship("User", foreign_keys=[invited_user_id], back_populates="received_invitations")
 
+    __table_args__ = (
+        # Duplicate-invite check in invite_to_organization
+        Index("ix_invite_org_email_status", "organization_id", "email", "status"),
+    )
+
     def is_expired(self):
         """Check if invitation has expired"""
         from datetime import datetime
@@ -285,6 +334,11 @@ class Query(Base):
     citations = relationship("Citation", back_populates="query", cascade="all, delete-orphan")
 
 
+# Serve keyset pagination of query history (newest first) from an index
+Index("ix_queries_org_created", Query.organization_id, Query.created_at.desc(), Query.id.desc())
+Index("ix_queries_user_created", Query.user_id, Query.created_at.desc(), Query.id.desc())
+
+
 class Citation(Base):
     __tablename__ = "citations"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -309,6 +363,7 @@ class Embedding(Base):
     source_type = Column(String(50), nullable=False)  # 'issue', 'repository'
     source_id = Column(Integer, nullable=False)
     source_metadata = Column(JSON)
+    user_id = Column(BigInteger, nullable=True)  # Denormalized from metadata for the search filter
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class Template(Base):
@@ -342,14 +397,21 @@ class Template(Base):
             "description": self.description,
             "is_public": self.is_public,
             "is_organization_template": self.is_organization_template,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            # orjson encodes naive datetimes exactly like isoformat()
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
             "owner": {
                 "id": self.owner.id,
                 "display_name": self.owner.display_name
             } if self.owner else None
         }
 
+# Listing pages filter by owner or organization and sort newest first
+Index("ix_templates_user_created", Template.user_id, Template.created_at.desc())
+Index("ix_templates_org_created", Template.organization_id, Template.created_at.desc())
+# Public templates are the third branch of the shared-templates listing
+Index("ix_templates_public_created", Template.created_at.desc(), postgresql_where=Template.is_public == True)
+
 
 class UploadedFile(Base):
     __tablename__ = "uploaded_files"
@@ -373,6 +435,9 @@ class UploadedFile(Base):
     owner = relationship("User", back_populates="uploads")
     organization = relationship("Organization", back_populates="uploads")
 
+Index("ix_uploads_user_created", UploadedFile.user_id, UploadedFile.created_at.desc())
+Index("ix_uploads_org_created", UploadedFile.organization_id, UploadedFile.created_at.desc())
+
 
 # Database initialization and helper functions
 def init_db(db_url):
@@ -381,9 +446,21 @@ def init_db(db_url):
         print("[DB] No DATABASE_URL provided, skipping DB init.")
         return
     try:
-        engine = create_engine(db_url)
+        if db_url.startswith("sqlite"):
+            engine = create_engine(db_url)
+        else:
+            engine = create_engine(
+                db_url,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=True,
+                pool_use_lifo=True
+            )
         Base.metadata.create_all(bind=engine)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        # expire_on_commit=False: serializing a row after commit shouldn't reload it
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
         print("[DB] Connected and initialized successfully with organization support.")
     except OperationalError as e:
         print(f"[DB] Could not connect to database: {e}")
@@ -398,6 +475,51 @@ def get_session():
     return SessionLocal()
 
 
+@contextmanager
+def get_session_ctx():
+    """
+    Context manager around get_session().
+    Yields None when the database is unavailable; otherwise rolls back on
+    error. Inside a Flask app context every caller gets the same session,
+    closed by close_request_session at teardown, so middleware and the route
+    share one pool checkout. Elsewhere (scripts, background threads) the
+    session is private and closed on exit.
+    """
+    if has_app_context():
+        if "db_session" not in g:
+            g.db_session = get_session()
+        session = g.db_session
+        if not session:
+            yield None
+            return
+        try:
+            yield session
+        except Exception:
+            session.rollback()
+            raise
+        return
+    
+    session = get_session()
+    if not session:
+        yield None
+        return
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def close_request_session(exc=None):
+    """teardown_appcontext hook: release the request's session, if one was opened"""
+    session = g.pop("db_session", None)
+    if session is not None:
+        if exc is not None:
+            session.rollback()
+        session.close()
+
+
 # Enhanced user helper functions
 def get_or_create_user(provider_id: str = None, email: str = None, display_name: str = None):
     """
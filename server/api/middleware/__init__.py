@@ -1,3 +1,4 @@
 from .context import get_current_user, get_user_organization
+from .auth_header import require_auth_header
 
-__all__ = ['get_current_user', 'get_user_organization']
\ No newline at end of file
+__all__ = ['get_current_user', 'get_user_organization', 'require_auth_header']
@@ -0,0 +1,22 @@
+# server/api/middleware/auth_header.py
+import os
+from functools import wraps
+from flask import request, jsonify
+
+AUTH0_ENABLED = os.getenv("AUTH0_ENABLED", "false").lower() == "true"
+
+def require_auth_header(f):
+    """
+    Reject requests without an Authorization header when Auth0 is enabled.
+    With Auth0 disabled the view is returned unwrapped, so it costs nothing per request.
+    """
+    if not AUTH0_ENABLED:
+        return f
+    
+    @wraps(f)
+    def wrapped(*args, **kwargs):
+        if "Authorization" not in request.headers:
+            return jsonify({"error": "Authentication required"}), 401
+        return f(*args, **kwargs)
+    
+    return wrapped
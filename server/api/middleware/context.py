@@ -1,58 +1,92 @@
 # server/api/middleware/context.py
 import os
-from flask import request
-from api.db import get_session, User, Organization
+import threading
+import time
+from collections import OrderedDict
+from flask import request, g
+from api.db import get_session, get_session_ctx, User, Organization
 
 AUTH0_ENABLED = os.getenv("AUTH0_ENABLED", "false").lower() == "true"
 
+# Identities resolved from Auth0 tokens, keyed by provider_id, so repeat
+# requests skip get_or_create_user's SELECTs. Only plain columns are kept:
+# each request gets a fresh User, so role lookups are never served stale.
+# Short TTL keeps profile edits visible.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+_user_cache = OrderedDict()
+_user_cache_lock = threading.Lock()
+
+# (id, email, display_name, personal_organization_id) of the dev user once it
+# has been looked up; dev-mode requests never query for their identity again
+_dev_user = None
+_dev_user_lock = threading.Lock()
+
 def get_current_user():
-    """Get current user from request context"""
-    if not AUTH0_ENABLED:
-        # ✅ Development mode: use or create dev user
-        session = get_session()
-        if not session:
-            return None
-        
-        try:
-            user = session.query(User).filter(User.email == "dev@localhost").first()
-            if not user:
-                # ✅ Create dev user inline instead of calling get_or_create_user
-                user = User(
-                    provider_id="dev-user-1",
-                    email="dev@localhost",
-                    display_name="Development User",
-                    is_active=True
-                )
-                session.add(user)
-                session.flush()
-                
-                # Create personal organization for dev user
-                from api.db import create_personal_organization
-                personal_org = create_personal_organization(user, session)
-                if personal_org:
-                    user.personal_organization_id = personal_org.id
-                
-                session.commit()
-                session.refresh(user)
-            
-            # ✅ Return user and close session properly
-            user_id = user.id
-            user_email = user.email
-            user_display_name = user.display_name
-            session.close()
+    """Get current user from request context (resolved once per request)"""
+    if "_cached_user" in g:
+        return g._cached_user
+    user = _resolve_current_user()
+    g._cached_user = user
+    return user
+
+def _dev_user_identity():
+    """
+    (id, email, display_name, personal_organization_id) of the dev user,
+    looked up or created on first use and then kept for the process
+    """
+    global _dev_user
+    if _dev_user is None:
+        # One thread creates the user; concurrent first requests wait instead
+        # of racing to insert the same email
+        with _dev_user_lock:
+            if _dev_user is None:
+                _dev_user = _load_dev_user()
+    return _dev_user
+
+def _load_dev_user():
+    """Find or create dev@localhost; None if the database is unavailable"""
+    session = get_session()
+    if not session:
+        return None
+    
+    try:
+        user = session.query(User).filter(User.email == "dev@localhost").first()
+        if not user:
+            # ✅ Create dev user inline instead of calling get_or_create_user
+            user = User(
+                provider_id="dev-user-1",
+                email="dev@localhost",
+                display_name="Development User",
+                is_active=True
+            )
+            session.add(user)
+            session.flush()
             
-            # Return a detached user object (not bound to session)
-            detached_user = User()
-            detached_user.id = user_id
-            detached_user.email = user_email
-            detached_user.display_name = user_display_name
-            return detached_user
+            # Create personal organization for dev user
+            from api.db import create_personal_organization
+            personal_org = create_personal_organization(user, session)
+            if personal_org:
+                user.personal_organization_id = personal_org.id
             
-        except Exception as e:
-            print(f"[Middleware] Error getting dev user: {e}")
-            session.rollback()
-            session.close()
-            return None
+            session.commit()
+            session.refresh(user)
+        
+        return (user.id, user.email, user.display_name, user.personal_organization_id)
+        
+    except Exception as e:
+        print(f"[Middleware] Error getting dev user: {e}")
+        session.rollback()
+        return None
+    finally:
+        session.close()
+
+def _resolve_current_user():
+    """Look up (or create) the user for the current request"""
+    if not AUTH0_ENABLED:
+        # ✅ Development mode: the dev identity is resolved once per process
+        identity = _dev_user_identity()
+        return _detached_user(*identity) if identity else None
     
     # ✅ Production mode: use Auth0 token
     user_data = getattr(request, "user", None)
@@ -64,6 +98,10 @@ def get_current_user():
     name = user_data.get("name") or user_data.get("nickname")
     picture = user_data.get("picture")
     
+    identity = _cached_user_lookup(provider_id)
+    if identity:
+        return _detached_user(*identity)
+    
     # ✅ Import here to avoid circular dependency
     from api.db import get_or_create_user
     
@@ -78,46 +116,95 @@ def get_current_user():
                 if db_user:
                     db_user.avatar_url = picture
                     session.commit()
+                    user.avatar_url = picture
                 session.close()
             except Exception as e:
                 print(f"[Middleware] Error updating avatar: {e}")
                 session.rollback()
                 session.close()
     
+    if user and provider_id:
+        _cache_user(provider_id, (
+            user.id, user.email, user.display_name,
+            user.personal_organization_id, user.avatar_url
+        ))
     return user
 
+def _detached_user(user_id, email, display_name, personal_organization_id, avatar_url=None):
+    """Fresh detached User for a cached identity (not bound to any session)"""
+    detached_user = User()
+    detached_user.id = user_id
+    detached_user.email = email
+    detached_user.display_name = display_name
+    detached_user.personal_organization_id = personal_organization_id
+    detached_user.avatar_url = avatar_url
+    return detached_user
+
+def _cached_user_lookup(provider_id):
+    """Return the cached identity tuple for provider_id, if still fresh"""
+    if not provider_id:
+        return None
+    with _user_cache_lock:
+        entry = _user_cache.get(provider_id)
+        if not entry:
+            return None
+        if time.monotonic() - entry[0] > USER_CACHE_TTL:
+            del _user_cache[provider_id]
+            return None
+        _user_cache.move_to_end(provider_id)
+        return entry[1]
+
+def _cache_user(provider_id, identity):
+    """Store a resolved identity, evicting the least recently used past USER_CACHE_SIZE"""
+    with _user_cache_lock:
+        _user_cache[provider_id] = (time.monotonic(), identity)
+        _user_cache.move_to_end(provider_id)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+
 def get_user_organization():
-    """Get the current organization context from request headers"""
+    """Get the current organization context (resolved once per request)"""
+    if "_cached_org" in g:
+        return g._cached_org
+    org = _resolve_user_organization()
+    g._cached_org = org
+    return org
+
+def _resolve_user_organization():
+    """Look up the organization named by the X-Organization-Id header"""
     org_id = request.headers.get("X-Organization-Id")
     if not org_id:
         return None
     
     try:
         org_id = int(org_id)
-        session = get_session()
-        if not session:
-            return None
-        
-        org = session.query(Organization).filter(Organization.id == org_id).first()
-        
-        # ✅ Create detached copy before closing session
-        if org:
-            org_dict = org.to_dict()
-            session.close()
+    except ValueError:
+        return None
+    
+    try:
+        # Request-scoped session, shared with the route that asked for the org
+        with get_session_ctx() as session:
+            if not session:
+                return None
+            
+            # If this lookup opens the transaction, end it afterwards so the
+            # connection isn't held idle while the route waits on other I/O
+            owns_transaction = not session.in_transaction()
+            org = session.get(Organization, org_id)
+            if owns_transaction:
+                session.commit()
+            if not org:
+                return None
             
-            # Return a detached organization object
+            # ✅ Plain-column copy so routes can't mutate the identity-map instance
+            # through current_org (to_dict() would also run a member COUNT nobody here needs)
             detached_org = Organization()
-            detached_org.id = org_dict['id']
-            detached_org.name = org_dict['name']
-            detached_org.slug = org_dict['slug']
-            detached_org.is_personal = org_dict['is_personal']
+            detached_org.id = org.id
+            detached_org.name = org.name
+            detached_org.slug = org.slug
+            detached_org.is_personal = org.is_personal
             return detached_org
-        else:
-            session.close()
-            return None
             
     except Exception as e:
         print(f"[Middleware] Error getting organization: {e}")
-        if 'session' in locals():
-            session.close()
-        return None
\ No newline at end of file
+        return None
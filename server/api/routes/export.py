@@ -1,93 +1,142 @@
 # server/api/routes/export.py
 import os
 import csv
-from io import StringIO
 from datetime import datetime
-from flask import Blueprint, request, jsonify
-from api.db import get_session, Query, Template
+from itertools import chain
+import orjson
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from sqlalchemy import select, union_all, literal
+from sqlalchemy.orm import selectinload
+from api.db import get_session_ctx, Query, Template
 from api.middleware import get_current_user, get_user_organization
+from api.utils import start_stream
 
 export_bp = Blueprint('export', __name__)
 AUTH0_ENABLED = os.getenv("AUTH0_ENABLED", "false").lower() == "true"
 
+# Rows per server-side cursor fetch; bounds export memory regardless of account size
+EXPORT_YIELD_PER = 500
+
+class _Echo:
+    """Write target for csv.writer that hands each formatted row straight back"""
+    def write(self, value):
+        return value
+
+def _scoped(query, model, current_user, current_org):
+    """Apply the org/user visibility filter used by the export"""
+    if AUTH0_ENABLED and current_user:
+        if current_org:
+            return query.filter(model.organization_id == current_org.id)
+        return query.filter(model.user_id == current_user.id)
+    return query
+
+def _stream_rows(session, current_user, current_org):
+    """Query and template iterables that fetch through server-side cursors"""
+    queries = _scoped(session.query(Query), Query, current_user, current_org)\
+        .order_by(Query.created_at.desc())\
+        .yield_per(EXPORT_YIELD_PER)
+    templates = _scoped(session.query(Template), Template, current_user, current_org)\
+        .options(selectinload(Template.owner))\
+        .order_by(Template.created_at.desc())\
+        .yield_per(EXPORT_YIELD_PER)
+    return queries, templates
+
+def _csv_rows_statement(current_user, current_org):
+    """Queries then templates as one UNION ALL, already in CSV column order"""
+    queries = _scoped(
+        select(literal(0).label("part"), literal("Query").label("kind"), Query.id,
+               Query.prompt.label("title"), Query.response.label("body"), Query.created_at),
+        Query, current_user, current_org
+    )
+    templates = _scoped(
+        select(literal(1).label("part"), literal("Template").label("kind"), Template.id,
+               Template.name.label("title"), Template.prompt.label("body"), Template.created_at),
+        Template, current_user, current_org
+    )
+    combined = union_all(queries, templates).subquery()
+    return select(combined.c.kind, combined.c.id, combined.c.title, combined.c.body, combined.c.created_at)\
+        .order_by(combined.c.part, combined.c.created_at.desc())
+
 @export_bp.route("/export")
 def export_data():
     """Export user data"""
     format_type = request.args.get("format", "json").lower()
     
-    session = get_session()
-    if not session:
-        return jsonify({"error": "Database not available"}), 500
-    
     try:
         current_user = get_current_user() if AUTH0_ENABLED else None
         current_org = get_user_organization()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+    # The session is request-scoped, so this is the one the stream will use
+    with get_session_ctx() as session:
+        if not session:
+            return jsonify({"error": "Database not available"}), 500
+    
+    if format_type == "csv":
+        # Rows are formatted and sent one at a time instead of building
+        # the whole file in a StringIO first
+        def generate():
+            writer = csv.writer(_Echo())
+            
+            with get_session_ctx() as session:
+                # Both tables come back through one statement and one cursor,
+                # executed before the header row so a failure is still a 500
+                rows = session.execute(
+                    _csv_rows_statement(current_user, current_org),
+                    execution_options={"yield_per": EXPORT_YIELD_PER}
+                )
+                yield writer.writerow(["Type", "ID", "Name/Prompt", "Response/Content", "Created At"])
+                
+                for kind, row_id, title, body, created_at in rows:
+                    yield writer.writerow([
+                        kind,
+                        row_id,
+                        title,
+                        body,
+                        created_at.isoformat() if created_at else ""
+                    ])
         
-        query_q = session.query(Query)
-        if AUTH0_ENABLED and current_user:
-            if current_org:
-                query_q = query_q.filter(Query.organization_id == current_org.id)
-            else:
-                query_q = query_q.filter(Query.user_id == current_user.id)
-        queries = query_q.order_by(Query.created_at.desc()).all()
-        
-        template_q = session.query(Template)
-        if AUTH0_ENABLED and current_user:
-            if current_org:
-                template_q = template_q.filter(Template.organization_id == current_org.id)
-            else:
-                template_q = template_q.filter(Template.user_id == current_user.id)
-        templates = template_q.order_by(Template.created_at.desc()).all()
-        
-        session.close()
+        try:
+            body = start_stream(generate())
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
         
-        if format_type == "csv":
-            output = StringIO()
-            writer = csv.writer(output)
+        return Response(stream_with_context(body), mimetype='text/csv', headers={
+            'Content-Disposition': 'attachment; filename=loominal_export.csv'
+        })
+    
+    def generate_json():
+        # Same shape as before, but written row by row so neither the ORM
+        # objects nor the encoded document are ever held in full
+        with get_session_ctx() as session:
+            queries, templates = _stream_rows(session, current_user, current_org)
             
-            writer.writerow(["Type", "ID", "Name/Prompt", "Response/Content", "Created At"])
-            for q in queries:
-                writer.writerow([
-                    "Query",
-                    q.id,
-                    q.prompt,
-                    q.response,
-                    q.created_at.isoformat() if q.created_at else ""
-                ])
+            # Run the first query before any output so a failure is still a 500
+            queries = iter(queries)
+            first = next(queries, None)
             
-            for t in templates:
-                writer.writerow([
-                    "Template",
-                    t.id,
-                    t.name,
-                    t.prompt,
-                    t.created_at.isoformat() if t.created_at else ""
-                ])
+            yield b'{"exported_at":' + orjson.dumps(datetime.now()) + b',"queries":['
+            for i, q in enumerate(chain((first,), queries) if first is not None else ()):
+                if i:
+                    yield b","
+                yield orjson.dumps({
+                    "id": q.id,
+                    "prompt": q.prompt,
+                    "response": q.response,
+                    "created_at": q.created_at
+                })
             
-            output.seek(0)
-            return output.getvalue(), 200, {
-                'Content-Type': 'text/csv',
-                'Content-Disposition': 'attachment; filename=loominal_export.csv'
-            }
-        
-        else:
-            data = {
-                "exported_at": datetime.now().isoformat(),
-                "queries": [
-                    {
-                        "id": q.id,
-                        "prompt": q.prompt,
-                        "response": q.response,
-                        "created_at": q.created_at.isoformat() if q.created_at else None
-                    }
-                    for q in queries
-                ],
-                "templates": [
-                    t.to_dict() for t in templates
-                ]
-            }
-            return jsonify(data)
-        
+            yield b'],"templates":['
+            for i, t in enumerate(templates):
+                if i:
+                    yield b","
+                yield orjson.dumps(t.to_dict())
+            yield b']}'
+    
+    try:
+        body = start_stream(generate_json())
     except Exception as e:
-        session.close()
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+    
+    return Response(stream_with_context(body), mimetype="application/json")
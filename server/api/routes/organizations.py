@@ -1,17 +1,21 @@
 # server/api/routes/organizations.py
 import os
 import re
-import secrets
+import base64
+import threading
 from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify
-from sqlalchemy import and_, insert, update
+from sqlalchemy import and_, func, insert, update
+from sqlalchemy.orm import load_only
 from api.db import (
-    get_session, Organization, OrganizationInvitation, OrganizationRole, 
-    InvitationStatus, User, user_organization_memberships,
+    get_session_ctx, Organization, OrganizationInvitation, OrganizationRole, 
+    InvitationStatus, MANAGER_ROLES, ROLE_BY_VALUE, User, user_organization_memberships,
     add_user_to_organization, remove_user_from_organization
 )
 from api.middleware import get_current_user
-from api.utils.validators import validate_email, validate_url
+from api.utils.validators import validate_email, validate_url, clean_str
+from api.utils.helpers import read_json
+from api.utils.http_cache import CACHE_CONTROL, fingerprint_etag, with_cache_headers, not_modified
 from api.middleware.rate_limit import rate_limit, rate_limit_strict
 
 
@@ -27,9 +31,26 @@ RESERVED_SLUGS = {
     'help', 'support', 'contact', 'terms', 'privacy', 'security'
 }
 
+# Columns read by to_dict() on list endpoints; everything else stays unloaded
+ORGANIZATION_LIST_COLUMNS = (
+    Organization.id, Organization.name, Organization.slug, Organization.description,
+    Organization.logo_url, Organization.website, Organization.is_personal,
+    Organization.is_active, Organization.max_members, Organization.plan_type,
+    Organization.created_at, Organization.updated_at
+)
+INVITATION_LIST_COLUMNS = (
+    OrganizationInvitation.id, OrganizationInvitation.organization_id,
+    OrganizationInvitation.role, OrganizationInvitation.email,
+    OrganizationInvitation.status, OrganizationInvitation.message,
+    OrganizationInvitation.invited_by_id, OrganizationInvitation.created_at,
+    OrganizationInvitation.expires_at, OrganizationInvitation.responded_at
+)
+
+_SLUG_RE = re.compile(r'^[a-z0-9-]+$')
+
 def validate_slug(slug: str) -> tuple[bool, str]:
     """
-    Validate organization slug
+    Validate organization slug (callers pass it already lowercased)
     Returns: (is_valid, error_message)
     """
     if not slug:
@@ -42,7 +63,7 @@ def validate_slug(slug: str) -> tuple[bool, str]:
         return False, "Slug must be less than 50 characters"
     
     # Only lowercase letters, numbers, and hyphens
-    if not re.match(r'^[a-z0-9-]+$', slug):
+    if not _SLUG_RE.match(slug):
         return False, "Slug can only contain lowercase letters, numbers, and hyphens"
     
     # Cannot start or end with hyphen
@@ -54,11 +75,41 @@ def validate_slug(slug: str) -> tuple[bool, str]:
         return False, "Slug cannot contain consecutive hyphens"
     
     # Check reserved slugs
-    if slug.lower() in RESERVED_SLUGS:
+    if slug in RESERVED_SLUGS:
         return False, f"'{slug}' is a reserved slug and cannot be used"
     
     return True, ""
 
+# Invite tokens are sliced from a per-thread os.urandom buffer (same entropy
+# source as secrets.token_urlsafe) so invite bursts don't pay a syscall each.
+_INVITE_TOKEN_BYTES = 32
+_RANDOM_BUFFER_SIZE = 4096
+_token_buffer = threading.local()
+
+def _generate_invite_token() -> str:
+    """Return a URL-safe invitation token with 32 bytes of entropy"""
+    buf = getattr(_token_buffer, "data", b"")
+    pos = getattr(_token_buffer, "pos", 0)
+    # Refill when drained, or after a fork so workers never share bytes
+    if pos + _INVITE_TOKEN_BYTES > len(buf) or getattr(_token_buffer, "pid", None) != os.getpid():
+        buf = os.urandom(_RANDOM_BUFFER_SIZE)
+        pos = 0
+        _token_buffer.data = buf
+        _token_buffer.pid = os.getpid()
+    _token_buffer.pos = pos + _INVITE_TOKEN_BYTES
+    chunk = buf[pos:pos + _INVITE_TOKEN_BYTES]
+    return base64.urlsafe_b64encode(chunk).rstrip(b"=").decode("ascii")
+
+@organizations_bp.before_request
+def _require_auth_header():
+    """Reject unauthenticated requests before any organization view runs"""
+    if AUTH0_ENABLED and request.method != "OPTIONS" and not request.headers.get("Authorization"):
+        return jsonify({"error": "Authentication required"}), 401
+
+def _parse_role(value):
+    """Map a role string from request input to OrganizationRole, or None if invalid"""
+    return ROLE_BY_VALUE.get(value) if isinstance(value, str) else None
+
 def validate_organization_name(name: str) -> tuple[bool, str]:
     """
     Validate organization name
@@ -82,53 +133,80 @@ def validate_organization_name(name: str) -> tuple[bool, str]:
 @organizations_bp.route("/organizations", methods=["GET"])
 def get_organizations():
     """Get user's organizations"""
-    if AUTH0_ENABLED:
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            return jsonify({"error": "Authentication required"}), 401
-    
-    session = get_session()
-    if not session:
-        return jsonify({"organizations": []})
-    
     try:
-        current_user = get_current_user()
-        if not current_user:
-            session.close()
-            return jsonify({"error": "User not found"}), 404
-        
-        membership_query = session.query(user_organization_memberships.c.organization_id).filter(
-            and_(
-                user_organization_memberships.c.user_id == current_user.id,
-                user_organization_memberships.c.is_active == True
-            )
-        )
-        
-        org_ids = [row[0] for row in membership_query.all()]
-        orgs = session.query(Organization).filter(Organization.id.in_(org_ids)).all()
-        result = [org.to_dict() for org in orgs]
-        
-        session.close()
-        return jsonify({"organizations": result})
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"organizations": []})
+            
+            current_user = get_current_user()
+            if not current_user:
+                return jsonify({"error": "User not found"}), 404
+            
+            # Cheap fingerprint first so unchanged lists never load any rows
+            member = user_organization_memberships.alias()
+            fingerprint = session.query(
+                func.count(member.c.user_id),
+                func.max(member.c.joined_at),
+                func.max(Organization.updated_at)
+            ).select_from(user_organization_memberships).join(
+                Organization,
+                Organization.id == user_organization_memberships.c.organization_id
+            ).join(
+                member,
+                and_(
+                    member.c.organization_id == user_organization_memberships.c.organization_id,
+                    member.c.is_active == True
+                )
+            ).filter(
+                and_(
+                    user_organization_memberships.c.user_id == current_user.id,
+                    user_organization_memberships.c.is_active == True
+                )
+            ).one()
+            etag = fingerprint_etag(current_user.id, *fingerprint)
+            cached = not_modified(etag)
+            if cached:
+                return cached
+            
+            orgs = session.query(Organization).options(
+                load_only(*ORGANIZATION_LIST_COLUMNS)
+            ).join(
+                user_organization_memberships,
+                Organization.id == user_organization_memberships.c.organization_id
+            ).filter(
+                and_(
+                    user_organization_memberships.c.user_id == current_user.id,
+                    user_organization_memberships.c.is_active == True
+                )
+            ).all()
+            
+            # One grouped count instead of a COUNT per organization in to_dict()
+            member_counts = dict(session.query(
+                user_organization_memberships.c.organization_id,
+                func.count()
+            ).filter(
+                and_(
+                    user_organization_memberships.c.organization_id.in_([org.id for org in orgs]),
+                    user_organization_memberships.c.is_active == True
+                )
+            ).group_by(user_organization_memberships.c.organization_id).all()) if orgs else {}
+            
+            result = [org.to_dict(member_count=member_counts.get(org.id, 0)) for org in orgs]
+            
+            return with_cache_headers(jsonify({"organizations": result}), etag)
         
     except Exception as e:
-        session.close()
         return jsonify({"error": str(e)}), 500
 
 @organizations_bp.route("/organizations", methods=["POST"])
 @rate_limit_strict(max_requests=5, window_seconds=60)
 def create_organization():
     """Create a new organization"""
-    if AUTH0_ENABLED:
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            return jsonify({"error": "Authentication required"}), 401
-    
-    data = request.get_json() or {}
+    data = read_json()
 
     # ✅ Safe handling and validation
-    name = (data.get("name") or "").strip()
-    slug = (data.get("slug") or "").strip().lower()  # Force lowercase
+    name = clean_str(data.get("name")) or ""
+    slug = (clean_str(data.get("slug")) or "").lower()  # Force lowercase
 
     # ✅ Validate name
     name_valid, name_error = validate_organization_name(name)
@@ -141,15 +219,13 @@ def create_organization():
         return jsonify({"error": slug_error}), 400
 
     # ✅ Safe handling of optional fields
-    desc_raw = data.get("description")
-    description = desc_raw.strip() if isinstance(desc_raw, str) and desc_raw else None
+    description = clean_str(data.get("description"))
     
     # ✅ Validate description length
     if description and len(description) > 500:
         return jsonify({"error": "Description must be less than 500 characters"}), 400
 
-    website_raw = data.get("website")
-    website = website_raw.strip() if isinstance(website_raw, str) and website_raw else None
+    website = clean_str(data.get("website"))
     
     # ✅ Validate website URL
     if website:
@@ -164,409 +240,335 @@ def create_organization():
     if plan_type not in ["free", "pro", "enterprise"]:
         return jsonify({"error": "Invalid plan type"}), 400
     
-    session = get_session()
-    if not session:
-        return jsonify({"error": "Database not available"}), 500
-    
     try:
-        current_user = get_current_user()
-        if not current_user:
-            session.close()
-            return jsonify({"error": "User not found"}), 404
-        
-        # Check if slug already exists
-        existing = session.query(Organization).filter(Organization.slug == slug).first()
-        if existing:
-            session.close()
-            return jsonify({"error": f"Slug '{slug}' is already taken"}), 400
-        
-        org = Organization(
-            name=name,
-            slug=slug,
-            description=description,
-            website=website,
-            plan_type=plan_type,
-            owner_id=current_user.id,
-            is_personal=False
-        )
-        
-        session.add(org)
-        session.flush()
-        
-        stmt = insert(user_organization_memberships).values(
-            user_id=current_user.id,
-            organization_id=org.id,
-            role=OrganizationRole.OWNER
-        )
-        session.execute(stmt)
-        
-        session.commit()
-        result = org.to_dict()
-        
-        session.close()
-        return jsonify({"organization": result}), 201
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"error": "Database not available"}), 500
+            
+            current_user = get_current_user()
+            if not current_user:
+                return jsonify({"error": "User not found"}), 404
+            
+            # Check if slug already exists (SELECT EXISTS, no row hydration)
+            slug_taken = session.query(
+                session.query(Organization.id).filter(Organization.slug == slug).exists()
+            ).scalar()
+            if slug_taken:
+                return jsonify({"error": f"Slug '{slug}' is already taken"}), 400
+            
+            org = Organization(
+                name=name,
+                slug=slug,
+                description=description,
+                website=website,
+                plan_type=plan_type,
+                owner_id=current_user.id,
+                is_personal=False
+            )
+            
+            session.add(org)
+            session.flush()
+            
+            stmt = insert(user_organization_memberships).values(
+                user_id=current_user.id,
+                organization_id=org.id,
+                role=OrganizationRole.OWNER
+            )
+            session.execute(stmt)
+            
+            session.commit()
+            result = org.to_dict()
+            
+            return jsonify({"organization": result}), 201
         
     except Exception as e:
-        session.rollback()
-        session.close()
         return jsonify({"error": str(e)}), 500
 
 @organizations_bp.route("/organizations/<int:org_id>", methods=["GET", "PUT", "DELETE"])
 def organization_detail(org_id):
     """Get, update, or delete organization"""
-    if AUTH0_ENABLED:
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            return jsonify({"error": "Authentication required"}), 401
-    
-    session = get_session()
-    if not session:
-        return jsonify({"error": "Database not available"}), 500
-    
     try:
-        current_user = get_current_user()
-        if not current_user:
-            session.close()
-            return jsonify({"error": "User not found"}), 404
-        
-        org = session.query(Organization).filter(Organization.id == org_id).first()
-        if not org:
-            session.close()
-            return jsonify({"error": "Organization not found"}), 404
-        
-        user_role = current_user.get_role_in_organization(org_id)
-        if not user_role:
-            session.close()
-            return jsonify({"error": "Access denied"}), 403
-        
-        if request.method == "GET":
-            result = org.to_dict()
-            session.close()
-            return jsonify({"organization": result})
-        
-        elif request.method == "PUT":
-            if user_role not in [OrganizationRole.OWNER, OrganizationRole.ADMIN]:
-                session.close()
-                return jsonify({"error": "Insufficient permissions"}), 403
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"error": "Database not available"}), 500
             
-            data = request.get_json() or {}
+            current_user = get_current_user()
+            if not current_user:
+                return jsonify({"error": "User not found"}), 404
             
-            if "name" in data:
-                org.name = (data["name"] or "").strip()
-            if "description" in data:
-                desc = data["description"]
-                org.description = (desc.strip() if isinstance(desc, str) and desc.strip() else None)
-            if "website" in data:
-                web = data["website"]
-                org.website = (web.strip() if isinstance(web, str) and web.strip() else None)
-            if "max_members" in data and user_role == OrganizationRole.OWNER:
-                org.max_members = int(data["max_members"])
+            org = session.get(Organization, org_id)
+            if not org:
+                return jsonify({"error": "Organization not found"}), 404
             
-            session.commit()
-            result = org.to_dict()
+            user_role = current_user.get_role_in_organization(org_id)
+            if not user_role:
+                return jsonify({"error": "Access denied"}), 403
             
-            session.close()
-            return jsonify({"organization": result})
-        
-        elif request.method == "DELETE":
-            if user_role != OrganizationRole.OWNER:
-                session.close()
-                return jsonify({"error": "Only owners can delete organizations"}), 403
+            if request.method == "GET":
+                return jsonify({"organization": org.to_dict()})
             
-            if org.is_personal:
-                session.close()
-                return jsonify({"error": "Cannot delete personal organization"}), 400
+            elif request.method == "PUT":
+                if user_role not in MANAGER_ROLES:
+                    return jsonify({"error": "Insufficient permissions"}), 403
+                
+                data = read_json()
+                
+                if "name" in data:
+                    org.name = clean_str(data.get("name")) or ""
+                if "description" in data:
+                    org.description = clean_str(data.get("description"))
+                if "website" in data:
+                    org.website = clean_str(data.get("website"))
+                if "max_members" in data and user_role == OrganizationRole.OWNER:
+                    org.max_members = int(data["max_members"])
+                
+                session.commit()
+                return jsonify({"organization": org.to_dict()})
             
-            session.delete(org)
-            session.commit()
-            session.close()
-            return jsonify({"message": "Organization deleted"})
+            elif request.method == "DELETE":
+                if user_role != OrganizationRole.OWNER:
+                    return jsonify({"error": "Only owners can delete organizations"}), 403
+                
+                if org.is_personal:
+                    return jsonify({"error": "Cannot delete personal organization"}), 400
+                
+                session.delete(org)
+                session.commit()
+                return jsonify({"message": "Organization deleted"})
         
     except Exception as e:
-        session.close()
         return jsonify({"error": str(e)}), 500
 
 @organizations_bp.route("/organizations/<int:org_id>/members", methods=["GET"])
 def get_organization_members(org_id):
     """Get organization members"""
-    if AUTH0_ENABLED:
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            return jsonify({"error": "Authentication required"}), 401
-    
-    session = get_session()
-    if not session:
-        return jsonify({"members": []})
-    
     try:
-        current_user = get_current_user()
-        if not current_user:
-            session.close()
-            return jsonify({"error": "User not found"}), 404
-        
-        user_role = current_user.get_role_in_organization(org_id)
-        if not user_role:
-            session.close()
-            return jsonify({"error": "Access denied"}), 403
-        
-        members_data = session.query(
-            User, user_organization_memberships.c.role, user_organization_memberships.c.joined_at
-        ).join(
-            user_organization_memberships,
-            User.id == user_organization_memberships.c.user_id
-        ).filter(
-            and_(
-                user_organization_memberships.c.organization_id == org_id,
-                user_organization_memberships.c.is_active == True
-            )
-        ).all()
-        
-        result = []
-        for user, role, joined_at in members_data:
-            result.append({
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"members": []})
+            
+            current_user = get_current_user()
+            if not current_user:
+                return jsonify({"error": "User not found"}), 404
+            
+            user_role = current_user.get_role_in_organization(org_id)
+            if not user_role:
+                return jsonify({"error": "Access denied"}), 403
+            
+            members_data = session.query(
+                User, user_organization_memberships.c.role, user_organization_memberships.c.joined_at
+            ).options(
+                load_only(User.id, User.email, User.display_name, User.avatar_url)
+            ).join(
+                user_organization_memberships,
+                User.id == user_organization_memberships.c.user_id
+            ).filter(
+                and_(
+                    user_organization_memberships.c.organization_id == org_id,
+                    user_organization_memberships.c.is_active == True
+                )
+            ).all()
+            
+            # role is a non-null SQLEnum column, so it always loads as OrganizationRole
+            result = [{
                 "id": user.id,
                 "email": user.email,
                 "display_name": user.display_name,
                 "avatar_url": user.avatar_url,
-                "role": role.value if hasattr(role, 'value') else role,
-                "joined_at": joined_at.isoformat() if joined_at else None,
+                "role": role.value,
+                "joined_at": joined_at,
                 "is_active": True
-            })
-        
-        session.close()
-        return jsonify({"members": result})
+            } for user, role, joined_at in members_data]
+            
+            # Profile fields have no change timestamp, so the ETag hashes the body
+            response = jsonify({"members": result})
+            response.add_etag()
+            response.headers["Cache-Control"] = CACHE_CONTROL
+            return response.make_conditional(request)
         
     except Exception as e:
-        session.close()
         return jsonify({"error": str(e)}), 500
 
 @organizations_bp.route("/organizations/<int:org_id>/members/<int:member_id>", methods=["PUT", "DELETE"])
 def manage_organization_member(org_id, member_id):
     """Update or remove organization member"""
-    if AUTH0_ENABLED:
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            return jsonify({"error": "Authentication required"}), 401
-    
-    session = get_session()
-    if not session:
-        return jsonify({"error": "Database not available"}), 500
-    
     try:
-        current_user = get_current_user()
-        if not current_user:
-            session.close()
-            return jsonify({"error": "User not found"}), 404
-        
-        user_role = current_user.get_role_in_organization(org_id)
-        if user_role not in [OrganizationRole.OWNER, OrganizationRole.ADMIN]:
-            session.close()
-            return jsonify({"error": "Insufficient permissions"}), 403
-        
-        if request.method == "PUT":
-            data = request.get_json() or {}
-            new_role = data.get("role")
-            
-            if not new_role:
-                session.close()
-                return jsonify({"error": "Role is required"}), 400
-            
-            try:
-                role_enum = OrganizationRole(new_role)
-            except ValueError:
-                session.close()
-                return jsonify({"error": "Invalid role"}), 400
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"error": "Database not available"}), 500
             
-            if role_enum == OrganizationRole.OWNER and user_role != OrganizationRole.OWNER:
-                session.close()
-                return jsonify({"error": "Only owners can assign owner role"}), 403
+            current_user = get_current_user()
+            if not current_user:
+                return jsonify({"error": "User not found"}), 404
             
-            stmt = update(user_organization_memberships).where(
-                and_(
-                    user_organization_memberships.c.user_id == member_id,
-                    user_organization_memberships.c.organization_id == org_id
-                )
-            ).values(role=role_enum)
+            user_role = current_user.get_role_in_organization(org_id)
+            if user_role not in MANAGER_ROLES:
+                return jsonify({"error": "Insufficient permissions"}), 403
             
-            session.execute(stmt)
-            session.commit()
-            session.close()
-            return jsonify({"message": "Member role updated"})
-        
-        elif request.method == "DELETE":
-            success = remove_user_from_organization(member_id, org_id)
-            if success:
-                return jsonify({"message": "Member removed"})
-            else:
-                return jsonify({"error": "Failed to remove member"}), 500
+            if request.method == "PUT":
+                data = read_json()
+                new_role = data.get("role")
+                
+                if not new_role:
+                    return jsonify({"error": "Role is required"}), 400
+                
+                role_enum = _parse_role(new_role)
+                if role_enum is None:
+                    return jsonify({"error": "Invalid role"}), 400
+                
+                if role_enum == OrganizationRole.OWNER and user_role != OrganizationRole.OWNER:
+                    return jsonify({"error": "Only owners can assign owner role"}), 403
+                
+                stmt = update(user_organization_memberships).where(
+                    and_(
+                        user_organization_memberships.c.user_id == member_id,
+                        user_organization_memberships.c.organization_id == org_id
+                    )
+                ).values(role=role_enum).returning(user_organization_memberships.c.user_id)
+                
+                # RETURNING tells us whether a membership matched without a separate SELECT
+                if session.execute(stmt).first() is None:
+                    return jsonify({"error": "Member not found"}), 404
+                
+                session.commit()
+                return jsonify({"message": "Member role updated"})
+            
+            elif request.method == "DELETE":
+                success = remove_user_from_organization(member_id, org_id)
+                if success:
+                    return jsonify({"message": "Member removed"})
+                else:
+                    return jsonify({"error": "Failed to remove member"}), 500
         
     except Exception as e:
-        session.close()
         return jsonify({"error": str(e)}), 500
 
 @organizations_bp.route("/organizations/<int:org_id>/invite", methods=["POST"])
 @rate_limit_strict(max_requests=10, window_seconds=60)
 def invite_to_organization(org_id):
     """Invite user to organization"""
-    if AUTH0_ENABLED:
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            return jsonify({"error": "Authentication required"}), 401
-    
-    session = get_session()
-    if not session:
-        return jsonify({"error": "Database not available"}), 500
-    
     try:
-        current_user = get_current_user()
-        if not current_user:
-            session.close()
-            return jsonify({"error": "User not found"}), 404
-        
-        user_role = current_user.get_role_in_organization(org_id)
-        if user_role not in [OrganizationRole.OWNER, OrganizationRole.ADMIN]:
-            session.close()
-            return jsonify({"error": "Insufficient permissions"}), 403
-        
-        data = request.get_json() or {}
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"error": "Database not available"}), 500
+            
+            current_user = get_current_user()
+            if not current_user:
+                return jsonify({"error": "User not found"}), 404
+            
+            user_role = current_user.get_role_in_organization(org_id)
+            if user_role not in MANAGER_ROLES:
+                return jsonify({"error": "Insufficient permissions"}), 403
+            
+            data = read_json()
 
-        email_raw = data.get("email")
-        email = email_raw.strip() if isinstance(email_raw, str) else ""
-        email_valid, email_error = validate_email(email)
-        if not email_valid:
-            session.close()
-            return jsonify({"error": email_error}), 400
-        role = data.get("role", "member")
-        msg_raw = data.get("message")
-        message = msg_raw.strip() if isinstance(msg_raw, str) and msg_raw.strip() else None
-        
-        if not email:
-            session.close()
-            return jsonify({"error": "Email is required"}), 400
-        
-        try:
-            role_enum = OrganizationRole(role)
-        except ValueError:
-            session.close()
-            return jsonify({"error": "Invalid role"}), 400
-        
-        org = session.query(Organization).filter(Organization.id == org_id).first()
-        if not org.can_add_member():
-            session.close()
-            return jsonify({"error": "Organization has reached maximum member limit"}), 400
-        
-        existing_invite = session.query(OrganizationInvitation).filter(
-            OrganizationInvitation.organization_id == org_id,
-            OrganizationInvitation.email == email,
-            OrganizationInvitation.status == InvitationStatus.PENDING
-        ).first()
-        
-        if existing_invite:
-            session.close()
-            return jsonify({"error": "Invitation already sent to this email"}), 400
-        
-        invited_user = session.query(User).filter(User.email == email).first()
-        
-        token = secrets.token_urlsafe(32)
-        expires_at = datetime.utcnow() + timedelta(days=7)
-        
-        invitation = OrganizationInvitation(
-            organization_id=org_id,
-            role=role_enum,
-            email=email,
-            invited_user_id=invited_user.id if invited_user else None,
-            token=token,
-            invited_by_id=current_user.id,
-            message=message,
-            expires_at=expires_at
-        )
-        
-        session.add(invitation)
-        session.commit()
-        
-        result = invitation.to_dict()
-        
-        session.close()
-        return jsonify({"invitation": result}), 201
+            email = clean_str(data.get("email")) or ""
+            email_valid, email_error = validate_email(email)
+            if not email_valid:
+                return jsonify({"error": email_error}), 400
+            role = data.get("role", "member")
+            message = clean_str(data.get("message"))
+            
+            if not email:
+                return jsonify({"error": "Email is required"}), 400
+            
+            role_enum = _parse_role(role)
+            if role_enum is None:
+                return jsonify({"error": "Invalid role"}), 400
+            
+            org = session.get(Organization, org_id)
+            if not org.can_add_member():
+                return jsonify({"error": "Organization has reached maximum member limit"}), 400
+            
+            existing_invite = session.query(
+                session.query(OrganizationInvitation.id).filter(
+                    OrganizationInvitation.organization_id == org_id,
+                    OrganizationInvitation.email == email,
+                    OrganizationInvitation.status == InvitationStatus.PENDING
+                ).exists()
+            ).scalar()
+            
+            if existing_invite:
+                return jsonify({"error": "Invitation already sent to this email"}), 400
+            
+            invited_user_id = session.query(User.id).filter(User.email == email).scalar()
+            
+            token = _generate_invite_token()
+            expires_at = datetime.utcnow() + timedelta(days=7)
+            
+            invitation = OrganizationInvitation(
+                organization_id=org_id,
+                role=role_enum,
+                email=email,
+                invited_user_id=invited_user_id,
+                token=token,
+                invited_by_id=current_user.id,
+                message=message,
+                expires_at=expires_at
+            )
+            
+            session.add(invitation)
+            session.commit()
+            
+            return jsonify({"invitation": invitation.to_dict()}), 201
         
     except Exception as e:
-        session.close()
         return jsonify({"error": str(e)}), 500
 
 @organizations_bp.route("/organizations/<int:org_id>/invitations", methods=["GET"])
 def get_organization_invitations(org_id):
     """Get organization invitations"""
-    if AUTH0_ENABLED:
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            return jsonify({"error": "Authentication required"}), 401
-    
-    session = get_session()
-    if not session:
-        return jsonify({"invitations": []})
-    
     try:
-        current_user = get_current_user()
-        if not current_user:
-            session.close()
-            return jsonify({"error": "User not found"}), 404
-        
-        user_role = current_user.get_role_in_organization(org_id)
-        if not user_role:
-            session.close()
-            return jsonify({"error": "Access denied"}), 403
-        
-        invitations = session.query(OrganizationInvitation).filter(
-            OrganizationInvitation.organization_id == org_id
-        ).order_by(OrganizationInvitation.created_at.desc()).all()
-        
-        result = [inv.to_dict() for inv in invitations]
-        
-        session.close()
-        return jsonify({"invitations": result})
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"invitations": []})
+            
+            current_user = get_current_user()
+            if not current_user:
+                return jsonify({"error": "User not found"}), 404
+            
+            user_role = current_user.get_role_in_organization(org_id)
+            if not user_role:
+                return jsonify({"error": "Access denied"}), 403
+            
+            invitations = session.query(OrganizationInvitation).options(
+                load_only(*INVITATION_LIST_COLUMNS)
+            ).filter(
+                OrganizationInvitation.organization_id == org_id
+            ).order_by(OrganizationInvitation.created_at.desc()).all()
+            
+            result = [inv.to_dict() for inv in invitations]
+            
+            return jsonify({"invitations": result})
         
     except Exception as e:
-        session.close()
         return jsonify({"error": str(e)}), 500
 
 @organizations_bp.route("/organizations/<int:org_id>/invitations/<int:invitation_id>", methods=["DELETE"])
 def revoke_invitation(org_id, invitation_id):
     """Revoke organization invitation"""
-    if AUTH0_ENABLED:
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            return jsonify({"error": "Authentication required"}), 401
-    
-    session = get_session()
-    if not session:
-        return jsonify({"error": "Database not available"}), 500
-    
     try:
-        current_user = get_current_user()
-        if not current_user:
-            session.close()
-            return jsonify({"error": "User not found"}), 404
-        
-        user_role = current_user.get_role_in_organization(org_id)
-        if user_role not in [OrganizationRole.OWNER, OrganizationRole.ADMIN]:
-            session.close()
-            return jsonify({"error": "Insufficient permissions"}), 403
-        
-        invitation = session.query(OrganizationInvitation).filter(
-            OrganizationInvitation.id == invitation_id,
-            OrganizationInvitation.organization_id == org_id
-        ).first()
-        
-        if not invitation:
-            session.close()
-            return jsonify({"error": "Invitation not found"}), 404
-        
-        invitation.status = InvitationStatus.EXPIRED
-        session.commit()
-        session.close()
-        
-        return jsonify({"message": "Invitation revoked"})
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"error": "Database not available"}), 500
+            
+            current_user = get_current_user()
+            if not current_user:
+                return jsonify({"error": "User not found"}), 404
+            
+            user_role = current_user.get_role_in_organization(org_id)
+            if user_role not in MANAGER_ROLES:
+                return jsonify({"error": "Insufficient permissions"}), 403
+            
+            invitation = session.get(OrganizationInvitation, invitation_id)
+            
+            if not invitation or invitation.organization_id != org_id:
+                return jsonify({"error": "Invitation not found"}), 404
+            
+            invitation.status = InvitationStatus.EXPIRED
+            session.commit()
+            
+            return jsonify({"message": "Invitation revoked"})
         
     except Exception as e:
-        session.close()
         return jsonify({"error": str(e)}), 500
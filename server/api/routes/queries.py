@@ -1,86 +1,224 @@
 # REPLACE your server/api/routes/queries.py with this updated version
 
-import math
-import json
-from flask import Blueprint, request, jsonify
-from api.db import Citation
-from api.db import get_session, Query
+import atexit
+import base64
+import queue
+import threading
+import time
+from itertools import chain
+from datetime import datetime
+import orjson
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
+from sqlalchemy import and_, or_, insert
+from sqlalchemy.orm import selectinload
+from api.db import get_session_ctx, Query, Citation
 from api.ai import call_ai
-from api.middleware import get_current_user, get_user_organization
+from api.middleware import get_current_user, get_user_organization, require_auth_header
 from api.middleware.rate_limit import rate_limit 
-from api.services.knowledge_retrieval import get_all_context, build_contextualized_prompt, extract_sources_list
-from api.db import Citation
+from api.utils.helpers import read_json, start_stream
+from api.services.knowledge_retrieval import get_all_context, build_contextualized_prompt, RAG_SYSTEM_PROMPT
 import os
 
 queries_bp = Blueprint('queries', __name__)
 AUTH0_ENABLED = os.getenv("AUTH0_ENABLED", "false").lower() == "true"
 
+MAX_PROMPT_LENGTH = 10000
+MAX_QUERY_BODY_SIZE = 32 * 1024
+PER_PAGE_DEFAULT = 20
+PER_PAGE_MAX = 100
+
+# Query history is written by one background thread that groups whatever arrives
+# within a few ms into a single transaction, so busy periods share one commit
+QUERY_PERSIST_BATCH_MAX = int(os.getenv("QUERY_PERSIST_BATCH_MAX", "64"))
+QUERY_PERSIST_BATCH_WAIT_MS = float(os.getenv("QUERY_PERSIST_BATCH_WAIT_MS", "5"))
+QUERY_PERSIST_SHUTDOWN_TIMEOUT = float(os.getenv("QUERY_PERSIST_SHUTDOWN_TIMEOUT", "10"))
+# Queued at exit: the worker saves the batch it is building and stops
+_PERSIST_STOP = object()
+_persist_queue = queue.Queue()
+_persist_thread = None
+_persist_logger = None
+_persist_thread_lock = threading.Lock()
+
+def _encode_cursor(created_at, query_id):
+    """Encode the (created_at, id) position of a row as an opaque cursor"""
+    raw = f"{created_at.isoformat()}|{query_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def _decode_cursor(cursor):
+    """Inverse of _encode_cursor; raises ValueError on malformed input"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode()
+        created_at, _, query_id = raw.partition("|")
+        return datetime.fromisoformat(created_at), int(query_id)
+    except (UnicodeError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def _insert_queries(items):
+    """Insert a batch of (prompt, response, sources, user_id, organization_id) in one transaction"""
+    with get_session_ctx() as session:
+        if not session:
+            return
+        
+        # Core multi-row INSERT ... RETURNING; ids come back in parameter
+        # order so citations can be matched to their query
+        query_ids = session.scalars(
+            insert(Query.__table__).returning(Query.__table__.c.id, sort_by_parameter_order=True),
+            [
+                {
+                    "prompt": prompt,
+                    "response": response,
+                    "user_id": user_id,
+                    "organization_id": organization_id
+                }
+                for prompt, response, _, user_id, organization_id in items
+            ]
+        ).all()
+        
+        # All citations for the batch in a single multi-row INSERT
+        rows = [
+            {
+                "query_id": query_id,
+                "source_type": source["type"],
+                "source_title": source["title"],
+                "source_url": source["url"],
+                "source_metadata": orjson.dumps(source.get("metadata", {})).decode()
+            }
+            for query_id, (_, _, sources, _, _) in zip(query_ids, items)
+            for source in sources or ()
+        ]
+        if rows:
+            session.execute(insert(Citation.__table__), rows)
+        
+        session.commit()
+
+def _save_queries(items, logger):
+    """Save a batch; if it fails, retry each item alone so one bad row only loses itself"""
+    try:
+        _insert_queries(items)
+        return
+    except Exception as e:
+        if len(items) == 1:
+            logger.error("Failed to save query for user %s: %s", items[0][3], e)
+            return
+        logger.warning("Batch save of %d queries failed, retrying individually: %s", len(items), e)
+    
+    for item in items:
+        try:
+            _insert_queries([item])
+        except Exception as e:
+            logger.error("Failed to save query for user %s: %s", item[3], e)
+
+def _persist_worker(logger):
+    """Drain the persist queue in batches of up to QUERY_PERSIST_BATCH_MAX"""
+    wait = QUERY_PERSIST_BATCH_WAIT_MS / 1000
+    while True:
+        item = _persist_queue.get()
+        if item is _PERSIST_STOP:
+            return
+        batch = [item]
+        stop = False
+        deadline = time.monotonic() + wait
+        while len(batch) < QUERY_PERSIST_BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = _persist_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _PERSIST_STOP:
+                stop = True
+                break
+            batch.append(item)
+        _save_queries(batch, logger)
+        if stop:
+            return
+
+def _flush_persist_queue():
+    """
+    At shutdown, stop the worker once its in-flight batch is committed (it is a
+    daemon thread, so exit would otherwise kill it mid-insert), then write
+    anything still queued.
+    """
+    if _persist_thread is not None:
+        _persist_queue.put(_PERSIST_STOP)
+        _persist_thread.join(QUERY_PERSIST_SHUTDOWN_TIMEOUT)
+        if _persist_thread.is_alive():
+            _persist_logger.warning(
+                "Query persist worker still busy after %ss; flushing the rest directly",
+                QUERY_PERSIST_SHUTDOWN_TIMEOUT
+            )
+    
+    pending = []
+    while True:
+        try:
+            item = _persist_queue.get_nowait()
+        except queue.Empty:
+            break
+        if item is not _PERSIST_STOP:
+            pending.append(item)
+    if pending:
+        _save_queries(pending, _persist_logger)
+
+atexit.register(_flush_persist_queue)
+
+def _save_query(prompt, response, sources, user_id, organization_id):
+    """Queue a query and its citations for the background writer"""
+    global _persist_thread, _persist_logger
+    if _persist_thread is None:
+        with _persist_thread_lock:
+            if _persist_thread is None:
+                # The worker has no app context, so it keeps the app's logger itself
+                _persist_logger = current_app.logger
+                _persist_thread = threading.Thread(
+                    target=_persist_worker, args=(_persist_logger,), name="query-persist", daemon=True
+                )
+                _persist_thread.start()
+    _persist_queue.put((prompt, response, sources, user_id, organization_id))
+
 @queries_bp.route("/query", methods=["POST"])
+@require_auth_header
 @rate_limit(max_requests=30, window_seconds=60)
 def query_ai():
     """Main AI query endpoint with context-aware responses"""
-    data = request.get_json() or {}
-    prompt = data.get("prompt", "").strip()
+    # Reject oversized bodies before parsing them (the app-wide limit is sized for uploads)
+    if request.content_length and request.content_length > MAX_QUERY_BODY_SIZE:
+        return jsonify({"error": "Request body too large"}), 413
+    
+    data = read_json()
+    prompt = data.get("prompt", "")
     use_context = data.get("use_context", True)  # Allow disabling context
     
+    if len(prompt) > MAX_PROMPT_LENGTH:
+        return jsonify({"error": "Prompt is too long (max 10000 characters)"}), 400
+    
+    prompt = prompt.strip()
     if not prompt:
         return jsonify({"error": "Prompt is required"}), 400
     
-    if len(prompt) > 10000:
-        return jsonify({"error": "Prompt is too long (max 10000 characters)"}), 400
-    
     try:
         current_user = get_current_user() if AUTH0_ENABLED else None
         current_org = get_user_organization()
         
         # Get relevant context from GitHub
-        context = {}
-        sources = []
+        context, sources, total_sources = "", [], 0
         if use_context and current_user:
-            context = get_all_context(prompt, current_user.id)
-            sources = extract_sources_list(context)
+            context, sources, total_sources = get_all_context(prompt, current_user.id)
         
         # Build contextualized prompt
-        if context.get("total_sources", 0) > 0:
-            ai_prompt = build_contextualized_prompt(prompt, context)
+        if total_sources > 0:
+            response = call_ai(build_contextualized_prompt(prompt, context, total_sources), system=RAG_SYSTEM_PROMPT)
         else:
-            ai_prompt = prompt
-        
-        # Get AI response
-        response = call_ai(ai_prompt)
+            response = call_ai(prompt)
         
-        # Save to database with citations
-        session = get_session()
-        if session:
-            try:
-                query_record = Query(
-                    prompt=prompt,
-                    response=response,
-                    user_id=current_user.id if current_user else None,
-                    organization_id=current_org.id if current_org else (current_user.personal_organization_id if current_user else None)
-                )
-                session.add(query_record)
-                session.flush()  # Get query ID
-                
-                # Add citations
-                if sources:
-                    from api.db import Citation
-                    for source in sources:
-                        citation = Citation(
-                            query_id=query_record.id,
-                            source_type=source["type"],
-                            source_title=source["title"],
-                            source_url=source["url"],
-                            source_metadata=json.dumps(source.get("metadata", {}))
-                        )
-                        session.add(citation)
-                
-                session.commit()
-                session.close()
-            except Exception as e:
-                print(f"[DB] Failed to save query: {e}")
-                session.rollback()
-                session.close()
+        # Persist off the request thread; the response doesn't need the row IDs
+        _save_query(
+            prompt,
+            response,
+            sources,
+            current_user.id if current_user else None,
+            current_org.id if current_org else (current_user.personal_organization_id if current_user else None)
+        )
         
         return jsonify({
             "response": response,
@@ -94,71 +232,99 @@ def query_ai():
 
 
 @queries_bp.route("/queries", methods=["GET"])
+@require_auth_header
 def get_queries():
-    """Get query history with pagination and citations"""
-    session = get_session()
-    if not session:
-        return jsonify({"queries": [], "meta": {"page": 1, "pages": 1, "total": 0}})
-    
+    """Get query history with keyset (cursor) pagination and citations"""
     try:
-        page = int(request.args.get("page", 1))
-        per_page = int(request.args.get("per_page", 20))
+        per_page = max(1, min(int(request.args.get("per_page", PER_PAGE_DEFAULT)), PER_PAGE_MAX))
+        cursor = request.args.get("cursor")
         
-        if page < 1:
-            page = 1
-        if per_page < 1 or per_page > 100:
-            per_page = 20
+        if cursor:
+            try:
+                cursor_ts, cursor_id = _decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
         
         current_user = get_current_user() if AUTH0_ENABLED else None
         current_org = get_user_organization()
         
-        query = session.query(Query)
-        
-        if AUTH0_ENABLED and current_user:
-            if current_org:
-                query = query.filter(Query.organization_id == current_org.id)
-            else:
-                query = query.filter(Query.user_id == current_user.id)
-        
-        total = query.count()
-        pages = math.ceil(total / per_page) if total > 0 else 1
-        
-        queries = query.order_by(Query.created_at.desc())\
-                      .offset((page - 1) * per_page)\
-                      .limit(per_page).all()
-        
-        result = []
-        for q in queries:
-            # Get citations for this query
-            citations = []
-            if q.citations:
-                for citation in q.citations:
-                    citations.append({
-                        "type": citation.source_type,
-                        "title": citation.source_title,
-                        "url": citation.source_url,
-                        "metadata": json.loads(citation.source_metadata) if citation.source_metadata else {}
-                    })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+    def generate():
+        # Rows are encoded and sent one at a time, so peak memory is one row
+        # rather than the whole page held as dicts and again as JSON.
+        with get_session_ctx() as session:
+            if not session:
+                yield orjson.dumps({"queries": [], "meta": {"per_page": per_page, "next_cursor": None}})
+                return
             
-            result.append({
-                "id": q.id,
-                "prompt": q.prompt,
-                "response": q.response,
-                "created_at": q.created_at.isoformat() if q.created_at else None,
-                "sources": citations
-            })
-        
-        session.close()
-        return jsonify({
-            "queries": result,
-            "meta": {
-                "page": page,
-                "per_page": per_page,
-                "pages": pages,
-                "total": total
-            }
-        })
-        
+            query = session.query(Query)
+            
+            if AUTH0_ENABLED and current_user:
+                if current_org:
+                    query = query.filter(Query.organization_id == current_org.id)
+                else:
+                    query = query.filter(Query.user_id == current_user.id)
+            
+            # Seek past the cursor instead of OFFSET so deep pages stay cheap
+            if cursor:
+                query = query.filter(or_(
+                    Query.created_at < cursor_ts,
+                    and_(Query.created_at == cursor_ts, Query.id < cursor_id)
+                ))
+            
+            # Fetch one extra row to know whether another page exists.
+            # Citations arrive in one batched SELECT ... IN (...) per fetched chunk
+            rows = iter(query.order_by(Query.created_at.desc(), Query.id.desc())
+                        .limit(per_page + 1)
+                        .options(selectinload(Query.citations))
+                        .yield_per(50))
+            
+            # Execute before the first yield: the route runs up to here before
+            # sending headers, so a database error is still a proper 500
+            first = next(rows, None)
+            
+            yield b'{"queries":['
+            count = 0
+            last = None
+            has_more = False
+            for q in chain((first,), rows) if first is not None else ():
+                if count == per_page:
+                    has_more = True
+                    break
+                if count:
+                    yield b","
+                yield orjson.dumps(_serialize_query(q))
+                last = q
+                count += 1
+            
+            next_cursor = _encode_cursor(last.created_at, last.id) if has_more and last.created_at else None
+            meta = {"per_page": per_page, "next_cursor": next_cursor}
+            yield b'],"meta":' + orjson.dumps(meta) + b'}'
+    
+    try:
+        body = start_stream(generate())
     except Exception as e:
-        session.close()
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+    
+    return current_app.response_class(stream_with_context(body), mimetype="application/json")
+
+
+def _serialize_query(q):
+    """Query row (with citations loaded) -> JSON-ready dict"""
+    return {
+        "id": q.id,
+        "prompt": q.prompt,
+        "response": q.response,
+        "created_at": q.created_at,
+        "sources": [
+            {
+                "type": citation.source_type,
+                "title": citation.source_title,
+                "url": citation.source_url,
+                "metadata": orjson.loads(citation.source_metadata) if citation.source_metadata else {}
+            }
+            for citation in q.citations
+        ]
+    }
@@ -1,51 +1,153 @@
 # server/api/routes/templates.py
-from flask import Blueprint, request, jsonify
-from api.db import get_session, Template
+import threading
+import time
+from flask import Blueprint, jsonify, current_app
+from sqlalchemy import event, func, select, union
+from sqlalchemy.orm import Session, object_session
+from api.db import get_session_ctx, Template, User
 from api.middleware import get_current_user, get_user_organization
-from api.utils import requires_auth_conditional
+from api.utils import requires_auth_conditional, read_json, fingerprint_etag, with_cache_headers, not_modified
 import os
 
 templates_bp = Blueprint('templates', __name__)
 AUTH0_ENABLED = os.getenv("AUTH0_ENABLED", "false").lower() == "true"
 
+# Rendered /templates responses per (user, org). Cleared whenever a template is
+# committed in this process; the TTL bounds staleness from other workers and
+# from owner display-name changes.
+TEMPLATES_CACHE_TTL = float(os.getenv("TEMPLATES_CACHE_TTL", "30"))
+TEMPLATES_CACHE_SIZE = 1024
+_templates_cache = {}
+_templates_cache_lock = threading.Lock()
+# Bumped on every clear; a response built across a clear is not cached
+_templates_generation = 0
+
+def _mark_templates_dirty(mapper, connection, target):
+    """Flag the session so its next commit invalidates the cache"""
+    session = object_session(target)
+    if session is not None:
+        session.info["templates_dirty"] = True
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(Template, _event_name, _mark_templates_dirty)
+
+@event.listens_for(Session, "after_commit")
+def _clear_templates_cache(session):
+    # Cleared on commit rather than at flush, so a concurrent read can't
+    # re-cache the pre-commit list
+    global _templates_generation
+    if session.info.pop("templates_dirty", False):
+        with _templates_cache_lock:
+            _templates_cache.clear()
+            _templates_generation += 1
+
+def _cached_templates(key):
+    """(etag, body) for key if cached and fresh"""
+    with _templates_cache_lock:
+        entry = _templates_cache.get(key)
+    if entry and time.monotonic() - entry[0] < TEMPLATES_CACHE_TTL:
+        return entry[1], entry[2]
+    return None
+
 @templates_bp.route("/templates", methods=["GET"])
 def get_templates():
     """Get all templates"""
-    session = get_session()
-    if not session:
-        return jsonify({"templates": []})
-    
     try:
-        current_user = get_current_user() if AUTH0_ENABLED else None
-        current_org = get_user_organization()
-        
-        query = session.query(Template)
-        
-        if AUTH0_ENABLED and current_user:
-            if current_org:
-                query = query.filter(
-                    (Template.organization_id == current_org.id) |
-                    (Template.user_id == current_user.id) |
-                    (Template.is_public == True)
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"templates": []})
+            
+            current_user = get_current_user() if AUTH0_ENABLED else None
+            current_org = get_user_organization()
+            
+            cache_key = (current_user.id if current_user else None, current_org.id if current_org else None)
+            generation = _templates_generation
+            cached_entry = _cached_templates(cache_key)
+            if cached_entry:
+                etag, body = cached_entry
+                cached = not_modified(etag)
+                if cached:
+                    return cached
+                return with_cache_headers(
+                    current_app.response_class(body, mimetype="application/json"), etag
                 )
-            else:
-                query = query.filter(Template.user_id == current_user.id)
-        
-        templates = query.order_by(Template.created_at.desc()).all()
-        result = [t.to_dict() for t in templates]
-        
-        session.close()
-        return jsonify({"templates": result})
+            
+            visibility = None
+            if AUTH0_ENABLED and current_user:
+                if current_org:
+                    # An OR across three columns usually ends in a seq scan; a UNION of
+                    # one select per branch lets each use its own index (and dedupes
+                    # templates that match more than one branch)
+                    visible_ids = union(
+                        select(Template.id).where(Template.organization_id == current_org.id),
+                        select(Template.id).where(Template.user_id == current_user.id),
+                        select(Template.id).where(Template.is_public == True)
+                    ).subquery()
+                    visibility = Template.id.in_(select(visible_ids.c.id))
+                else:
+                    visibility = Template.user_id == current_user.id
+            
+            # Cheap fingerprint first; an unchanged list skips loading and serializing
+            fingerprint = session.query(
+                func.count(Template.id), func.max(Template.updated_at), func.max(Template.id)
+            )
+            if visibility is not None:
+                fingerprint = fingerprint.filter(visibility)
+            etag = fingerprint_etag(
+                current_user.id if current_user else None,
+                current_org.id if current_org else None,
+                *fingerprint.one()
+            )
+            cached = not_modified(etag)
+            if cached:
+                return cached
+            
+            # Plain column rows (no ORM instances); the owner comes from the same
+            # SELECT via an outer join. Same shape as Template.to_dict().
+            stmt = select(
+                Template.id, Template.name, Template.prompt, Template.description,
+                Template.is_public, Template.is_organization_template,
+                Template.created_at, Template.updated_at,
+                User.id.label("owner_id"), User.display_name.label("owner_display_name")
+            ).outerjoin(User, Template.user_id == User.id)
+            if visibility is not None:
+                stmt = stmt.where(visibility)
+            
+            rows = session.execute(stmt.order_by(Template.created_at.desc()))
+            result = [
+                {
+                    "id": row.id,
+                    "name": row.name,
+                    "prompt": row.prompt,
+                    "description": row.description,
+                    "is_public": row.is_public,
+                    "is_organization_template": row.is_organization_template,
+                    "created_at": row.created_at,
+                    "updated_at": row.updated_at,
+                    "owner": {
+                        "id": row.owner_id,
+                        "display_name": row.owner_display_name
+                    } if row.owner_id is not None else None
+                }
+                for row in rows
+            ]
+            
+            response = jsonify({"templates": result})
+            with _templates_cache_lock:
+                if generation == _templates_generation:
+                    if len(_templates_cache) >= TEMPLATES_CACHE_SIZE:
+                        _templates_cache.clear()
+                    _templates_cache[cache_key] = (time.monotonic(), etag, response.get_data())
+            return with_cache_headers(response, etag)
         
     except Exception as e:
-        session.close()
         return jsonify({"error": str(e)}), 500
 
 @templates_bp.route("/templates", methods=["POST"])
 @requires_auth_conditional
 def create_template():
     """Create a new template"""
-    data = request.get_json() or {}
+    data = read_json()
     name = data.get("name", "").strip()
     prompt = data.get("prompt", "").strip()
     description = data.get("description", "").strip()
@@ -54,102 +156,89 @@ def create_template():
     if not name or not prompt:
         return jsonify({"error": "Name and prompt are required"}), 400
     
-    session = get_session()
-    if not session:
-        return jsonify({"error": "Database not available"}), 500
-    
     try:
-        current_user = get_current_user() if AUTH0_ENABLED else None
-        current_org = get_user_organization()
-        
-        template = Template(
-            name=name,
-            prompt=prompt,
-            description=description if description else None,
-            user_id=current_user.id if current_user else None,
-            organization_id=current_org.id if current_org else (current_user.personal_organization_id if current_user else None),
-            is_organization_template=is_organization_template
-        )
-        session.add(template)
-        session.commit()
-        
-        result = template.to_dict()
-        
-        session.close()
-        return jsonify({"template": result}), 201
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"error": "Database not available"}), 500
+            
+            current_user = get_current_user() if AUTH0_ENABLED else None
+            current_org = get_user_organization()
+            
+            template = Template(
+                name=name,
+                prompt=prompt,
+                description=description if description else None,
+                user_id=current_user.id if current_user else None,
+                organization_id=current_org.id if current_org else (current_user.personal_organization_id if current_user else None),
+                is_organization_template=is_organization_template
+            )
+            session.add(template)
+            session.commit()
+            
+            return jsonify({"template": template.to_dict()}), 201
         
     except Exception as e:
-        session.close()
         return jsonify({"error": str(e)}), 500
 
 @templates_bp.route("/templates/<int:template_id>", methods=["PUT"])
 @requires_auth_conditional
 def update_template(template_id):
     """Update a template"""
-    session = get_session()
-    if not session:
-        return jsonify({"error": "Database not available"}), 500
-    
     try:
-        current_user = get_current_user() if AUTH0_ENABLED else None
-        
-        query = session.query(Template).filter(Template.id == template_id)
-        if AUTH0_ENABLED and current_user:
-            query = query.filter(Template.user_id == current_user.id)
-        
-        template = query.first()
-        if not template:
-            session.close()
-            return jsonify({"error": "Template not found"}), 404
-        
-        data = request.get_json() or {}
-        name = data.get("name", "").strip()
-        prompt = data.get("prompt", "").strip()
-        
-        if not name or not prompt:
-            session.close()
-            return jsonify({"error": "Name and prompt are required"}), 400
-        
-        template.name = name
-        template.prompt = prompt
-        if "description" in data:
-            template.description = data.get("description", "").strip() or None
-        session.commit()
-        
-        result = template.to_dict()
-        
-        session.close()
-        return jsonify({"template": result})
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"error": "Database not available"}), 500
+            
+            current_user = get_current_user() if AUTH0_ENABLED else None
+            
+            query = session.query(Template).filter(Template.id == template_id)
+            if AUTH0_ENABLED and current_user:
+                query = query.filter(Template.user_id == current_user.id)
+            
+            template = query.first()
+            if not template:
+                return jsonify({"error": "Template not found"}), 404
+            
+            data = read_json()
+            name = data.get("name", "").strip()
+            prompt = data.get("prompt", "").strip()
+            
+            if not name or not prompt:
+                return jsonify({"error": "Name and prompt are required"}), 400
+            
+            template.name = name
+            template.prompt = prompt
+            if "description" in data:
+                template.description = data.get("description", "").strip() or None
+            session.commit()
+            
+            return jsonify({"template": template.to_dict()})
         
     except Exception as e:
-        session.close()
         return jsonify({"error": str(e)}), 500
 
 @templates_bp.route("/templates/<int:template_id>", methods=["DELETE"])
 @requires_auth_conditional
 def delete_template(template_id):
     """Delete a template"""
-    session = get_session()
-    if not session:
-        return jsonify({"error": "Database not available"}), 500
-    
     try:
-        current_user = get_current_user() if AUTH0_ENABLED else None
-        
-        query = session.query(Template).filter(Template.id == template_id)
-        if AUTH0_ENABLED and current_user:
-            query = query.filter(Template.user_id == current_user.id)
-        
-        template = query.first()
-        if not template:
-            session.close()
-            return jsonify({"error": "Template not found"}), 404
-        
-        session.delete(template)
-        session.commit()
-        session.close()
-        return jsonify({"message": "Template deleted"})
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"error": "Database not available"}), 500
+            
+            current_user = get_current_user() if AUTH0_ENABLED else None
+            
+            query = session.query(Template).filter(Template.id == template_id)
+            if AUTH0_ENABLED and current_user:
+                query = query.filter(Template.user_id == current_user.id)
+            
+            template = query.first()
+            if not template:
+                return jsonify({"error": "Template not found"}), 404
+            
+            session.delete(template)
+            session.commit()
+            return jsonify({"message": "Template deleted"})
         
     except Exception as e:
-        session.close()
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
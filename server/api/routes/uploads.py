@@ -1,27 +1,46 @@
 # server/api/routes/uploads.py
 import os
-import math
-from datetime import datetime
-from flask import Blueprint, request, jsonify, send_file
+import mimetypes
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import unquote
+from flask import Blueprint, request, jsonify, send_file, make_response
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
-from api.db import get_session, UploadedFile
+from sqlalchemy import func, select
+from api.db import get_session_ctx, UploadedFile
 from api.middleware import get_current_user, get_user_organization
+from api.utils.http_cache import fingerprint_etag, with_cache_headers, not_modified
 
 uploads_bp = Blueprint('uploads', __name__)
 AUTH0_ENABLED = os.getenv("AUTH0_ENABLED", "false").lower() == "true"
 UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
+# Joined once; stored names are secure_filename output, so plain concatenation is safe
+_UPLOAD_DIR_PREFIX = os.path.join(UPLOAD_FOLDER, "")
 MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+PER_PAGE_MAX = 100
+# Behind nginx, hand downloads to an internal location (e.g. location /protected/ { internal; alias <UPLOAD_FOLDER>/; })
+USE_X_ACCEL = os.getenv("USE_X_ACCEL", "false").lower() == "true"
+X_ACCEL_PREFIX = os.getenv("X_ACCEL_PREFIX", "/protected/")
+
+# Disk writes for uploads overlap with reading the next chunk off the socket
+_upload_writer = ThreadPoolExecutor(
+    max_workers=int(os.getenv("UPLOAD_WRITER_THREADS", "4")),
+    thread_name_prefix="upload-writer"
+)
 
 # ✅ Allowed file extensions
-ALLOWED_EXTENSIONS = {
+ALLOWED_EXTENSIONS = frozenset({
     'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 
     'xls', 'xlsx', 'ppt', 'pptx', 'csv', 'json', 'xml', 'zip'
-}
+})
 
-def allowed_file(filename):
+def allowed_file(filename: str) -> bool:
     """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    _, dot, ext = filename.rpartition('.')
+    return bool(dot) and ext.lower() in ALLOWED_EXTENSIONS
 
 @uploads_bp.route("/upload", methods=["POST"])
 def upload_file():
@@ -31,73 +50,116 @@ def upload_file():
         if not auth_header:
             return jsonify({"error": "Authentication required"}), 401
     
-    if "file" not in request.files:
-        return jsonify({"error": "No file part in request"}), 400
+    # ✅ Validate file size BEFORE reading the body
+    if request.content_length and request.content_length > MAX_UPLOAD_SIZE:
+        max_mb = MAX_UPLOAD_SIZE / (1024 * 1024)
+        return jsonify({"error": f"File too large. Maximum size is {max_mb}MB"}), 413
+    
+    # Raw bodies (the web client) skip Werkzeug's multipart parser and its spool file
+    if request.mimetype == "application/octet-stream":
+        original_name = unquote(request.headers.get("X-Filename", ""))
+        if not original_name:
+            return jsonify({"error": "X-Filename header is required"}), 400
+        source = request.stream
+        content_type = None
+    else:
+        if "file" not in request.files:
+            return jsonify({"error": "No file part in request"}), 400
 
-    file = request.files["file"]
-    if file.filename == "":
-        return jsonify({"error": "No selected file"}), 400
+        file = request.files["file"]
+        if file.filename == "":
+            return jsonify({"error": "No selected file"}), 400
+        original_name = file.filename
+        source = file.stream
+        content_type = file.content_type
 
-    filename = secure_filename(file.filename)
+    filename = secure_filename(original_name)
     if not filename:
         return jsonify({"error": "Invalid filename"}), 400
+    content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
     
     # ✅ Validate file extension
     if not allowed_file(filename):
         return jsonify({"error": "File type not allowed"}), 400
     
-    # ✅ Validate file size BEFORE saving
-    if request.content_length and request.content_length > MAX_UPLOAD_SIZE:
-        max_mb = MAX_UPLOAD_SIZE / (1024 * 1024)
-        return jsonify({"error": f"File too large. Maximum size is {max_mb}MB"}), 413
+    # Nanosecond timestamp keeps names sortable by upload time; the random suffix
+    # covers uploads landing in the same tick (open(..., "x") catches the rest)
+    filepath = f"{_UPLOAD_DIR_PREFIX}{time.time_ns()}_{secrets.token_hex(3)}_{filename}"
     
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    unique_filename = f"{timestamp}_{filename}"
-    filepath = os.path.join(UPLOAD_FOLDER, unique_filename)
+    # Exclusive create: never overwrite an existing file, and no exists() check first.
+    # Opened outside the cleanup try below so a clash can't delete someone else's file.
+    try:
+        fh = open(filepath, "xb", buffering=UPLOAD_CHUNK_SIZE)
+    except FileExistsError:
+        return jsonify({"error": "Upload name collision, please retry"}), 409
+    except OSError as e:
+        return jsonify({"error": str(e)}), 500
     
     try:
-        # ✅ Save with size limit check
-        file.save(filepath)
+        # ✅ Stream to disk in fixed-size chunks, aborting as soon as the limit is passed.
+        # Each chunk is written on the writer pool while the next one is read from the
+        # socket; at most one write is in flight, so memory stays at two chunks.
+        file_size = 0
+        pending = None
+        with fh:
+            try:
+                while True:
+                    try:
+                        chunk = source.read(UPLOAD_CHUNK_SIZE)
+                    except RequestEntityTooLarge:
+                        # Chunked bodies carry no Content-Length, so Werkzeug's limited
+                        # stream stops them at MAX_CONTENT_LENGTH instead of the check above
+                        file_size = MAX_UPLOAD_SIZE + 1
+                        break
+                    if not chunk:
+                        break
+                    file_size += len(chunk)
+                    if file_size > MAX_UPLOAD_SIZE:
+                        break
+                    if pending:
+                        pending.result()
+                    pending = _upload_writer.submit(fh.write, chunk)
+                if pending:
+                    pending.result()
+            finally:
+                # Never close the file under a write that is still running
+                if pending:
+                    wait([pending])
         
-        # ✅ Double-check file size after save
-        file_size = os.path.getsize(filepath)
         if file_size > MAX_UPLOAD_SIZE:
-            os.remove(filepath)  # Delete if too large
+            os.remove(filepath)
             max_mb = MAX_UPLOAD_SIZE / (1024 * 1024)
             return jsonify({"error": f"File too large. Maximum size is {max_mb}MB"}), 413
         
-        session = get_session()
-        if session:
-            try:
-                current_user = get_current_user() if AUTH0_ENABLED else None
-                current_org = get_user_organization()
-                
-                upload_record = UploadedFile(
-                    filename=filename,
-                    stored_path=filepath,
-                    content_type=file.content_type,
-                    size=file_size,
-                    user_id=current_user.id if current_user else None,
-                    organization_id=current_org.id if current_org else (current_user.personal_organization_id if current_user else None)
-                )
-                session.add(upload_record)
-                session.commit()
-                
-                result = {
-                    "id": upload_record.id,
-                    "filename": upload_record.filename,
-                    "size": upload_record.size,
-                    "content_type": upload_record.content_type,
-                    "created_at": upload_record.created_at.isoformat() if upload_record.created_at else None
-                }
-                
-                session.close()
-                return jsonify({"upload": result}), 201
-            
-            except Exception as e:
-                session.close()
-                print(f"[DB] Failed to save upload record: {e}")
-                # Don't delete file if DB fails, just continue
+        try:
+            with get_session_ctx() as session:
+                if session:
+                    current_user = get_current_user() if AUTH0_ENABLED else None
+                    current_org = get_user_organization()
+                    
+                    upload_record = UploadedFile(
+                        filename=filename,
+                        stored_path=filepath,
+                        content_type=content_type,
+                        size=file_size,
+                        user_id=current_user.id if current_user else None,
+                        organization_id=current_org.id if current_org else (current_user.personal_organization_id if current_user else None)
+                    )
+                    session.add(upload_record)
+                    session.commit()
+                    
+                    result = {
+                        "id": upload_record.id,
+                        "filename": upload_record.filename,
+                        "size": upload_record.size,
+                        "content_type": upload_record.content_type,
+                        "created_at": upload_record.created_at
+                    }
+                    return jsonify({"upload": result}), 201
+        
+        except Exception as e:
+            print(f"[DB] Failed to save upload record: {e}")
+            # Don't delete file if DB fails, just continue
         
         return jsonify({
             "message": "File uploaded successfully",
@@ -114,81 +176,133 @@ def upload_file():
                 pass
         return jsonify({"error": str(e)}), 500
 
+def _uploads_etag(current_user, current_org, page, per_page, count, newest_id):
+    """ETag for one page of the upload list"""
+    return fingerprint_etag(
+        current_user.id if current_user else None,
+        current_org.id if current_org else None,
+        page, per_page, count, newest_id
+    )
+
 @uploads_bp.route("/uploads", methods=["GET"])
 def get_uploads():
     """Get uploaded files list"""
-    session = get_session()
-    if not session:
-        return jsonify({"uploads": [], "meta": {"page": 1, "pages": 1}})
-    
     try:
-        current_user = get_current_user() if AUTH0_ENABLED else None
-        current_org = get_user_organization()
-        
-        page = int(request.args.get("page", 1))
-        per_page = int(request.args.get("per_page", 10))
-        
-        query = session.query(UploadedFile)
-        
-        if AUTH0_ENABLED and current_user:
-            if current_org:
-                query = query.filter(UploadedFile.organization_id == current_org.id)
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"uploads": [], "meta": {"page": 1, "pages": 1}})
+            
+            current_user = get_current_user() if AUTH0_ENABLED else None
+            current_org = get_user_organization()
+            
+            # Clamped: page < 1 would be a negative OFFSET, and an unbounded
+            # per_page turns the page query into a full scan
+            page = max(1, int(request.args.get("page", 1)))
+            per_page = max(1, min(int(request.args.get("per_page", 10)), PER_PAGE_MAX))
+            
+            scope = []
+            if AUTH0_ENABLED and current_user:
+                if current_org:
+                    scope.append(UploadedFile.organization_id == current_org.id)
+                else:
+                    scope.append(UploadedFile.user_id == current_user.id)
+            
+            # Uploads are insert-only, so count + newest id identify the list state
+            fingerprint = select(func.count(UploadedFile.id), func.max(UploadedFile.id)).where(*scope)
+            
+            # Plain column rows: the response only needs five fields, not ORM instances
+            def page_of(*extra):
+                return select(
+                    UploadedFile.id, UploadedFile.filename, UploadedFile.size,
+                    UploadedFile.content_type, UploadedFile.created_at, *extra
+                ).where(*scope)\
+                 .order_by(UploadedFile.created_at.desc())\
+                 .offset((page - 1) * per_page)\
+                 .limit(per_page)
+            
+            if request.if_none_match:
+                # Conditional request: check the cheap fingerprint before fetching the page
+                count, newest_id = session.execute(fingerprint).one()
+                etag = _uploads_etag(current_user, current_org, page, per_page, count, newest_id)
+                cached = not_modified(etag)
+                if cached:
+                    return cached
+                rows = session.execute(page_of()).all()
             else:
-                query = query.filter(UploadedFile.user_id == current_user.id)
-        
-        total = query.count()
-        pages = math.ceil(total / per_page) if total > 0 else 1
-        
-        uploads = query.order_by(UploadedFile.created_at.desc())\
-                      .offset((page - 1) * per_page)\
-                      .limit(per_page).all()
-        
-        result = []
-        for u in uploads:
-            result.append({
-                "id": u.id,
-                "filename": u.filename,
-                "size": u.size,
-                "content_type": u.content_type,
-                "created_at": u.created_at.isoformat() if u.created_at else None
-            })
-        
-        session.close()
-        return jsonify({
-            "uploads": result,
-            "meta": {"page": page, "pages": pages, "total": total}
-        })
+                # Nothing to revalidate: take the fingerprint from window functions
+                # over the same scan, so the page costs one round-trip
+                rows = session.execute(page_of(
+                    func.count(UploadedFile.id).over(),
+                    func.max(UploadedFile.id).over()
+                )).all()
+                if rows:
+                    count, newest_id = rows[0][5], rows[0][6]
+                else:
+                    # Past the last page there is no row to read the totals from
+                    count, newest_id = session.execute(fingerprint).one()
+                etag = _uploads_etag(current_user, current_org, page, per_page, count, newest_id)
+            
+            total = count
+            pages = (total + per_page - 1) // per_page if total else 1
+            
+            result = [
+                {
+                    "id": row[0],
+                    "filename": row[1],
+                    "size": row[2],
+                    "content_type": row[3],
+                    "created_at": row[4]
+                }
+                for row in rows
+            ]
+            
+            return with_cache_headers(jsonify({
+                "uploads": result,
+                "meta": {"page": page, "pages": pages, "total": total}
+            }), etag)
         
     except Exception as e:
-        session.close()
         return jsonify({"error": str(e)}), 500
 
 @uploads_bp.route("/download/<int:file_id>")
 def download_file(file_id):
     """Download a file"""
-    session = get_session()
-    if not session:
-        return jsonify({"error": "Database not available"}), 500
-    
     try:
-        current_user = get_current_user() if AUTH0_ENABLED else None
-        
-        query = session.query(UploadedFile).filter(UploadedFile.id == file_id)
-        if AUTH0_ENABLED and current_user:
-            query = query.filter(UploadedFile.user_id == current_user.id)
+        with get_session_ctx() as session:
+            if not session:
+                return jsonify({"error": "Database not available"}), 500
+            
+            current_user = get_current_user() if AUTH0_ENABLED else None
+            
+            query = session.query(UploadedFile).filter(UploadedFile.id == file_id)
+            if AUTH0_ENABLED and current_user:
+                query = query.filter(UploadedFile.user_id == current_user.id)
+            
+            upload = query.first()
         
-        upload = query.first()
         if not upload:
-            session.close()
             return jsonify({"error": "File not found"}), 404
         
         if not os.path.exists(upload.stored_path):
-            session.close()
             return jsonify({"error": "File no longer exists on disk"}), 404
         
-        session.close()
-        return send_file(upload.stored_path, as_attachment=True, download_name=upload.filename)
+        if USE_X_ACCEL:
+            # nginx streams the file with sendfile(2); Python never touches the bytes
+            response = make_response("")
+            response.headers["X-Accel-Redirect"] = X_ACCEL_PREFIX + os.path.basename(upload.stored_path)
+            response.headers.set("Content-Disposition", "attachment", filename=upload.filename)
+            response.headers["Content-Type"] = upload.content_type or "application/octet-stream"
+            return response
+        
+        # conditional/etag answer repeat downloads with 304 and honour Range requests
+        return send_file(
+            upload.stored_path,
+            as_attachment=True,
+            download_name=upload.filename,
+            mimetype=upload.content_type or None,
+            conditional=True,
+            etag=True
+        )
         
     except Exception as e:
-        session.close()
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
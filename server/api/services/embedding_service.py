@@ -1,7 +1,25 @@
 from sentence_transformers import SentenceTransformer
 import numpy as np
 from typing import List, Dict
+import os
 import re
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import Future
+
+# Reduced precision is opt-in: query vectors should come from the same
+# weights as the stored ones. FP16 applies on GPU, INT8 (Linear layers) on CPU.
+EMBEDDING_FP16 = os.getenv("EMBEDDING_FP16", "false").lower() == "true"
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "false").lower() == "true"
+
+# Request coalescing for single-query embeds (see BatchedEmbedder)
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "32"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+
+# Sentence boundaries used by chunk_text: ". " or a newline
+_SENTENCE_BREAK_RE = re.compile(r"\. |\n")
 
 class EmbeddingService:
     """
@@ -13,6 +31,16 @@ class EmbeddingService:
         # Load the model once (will download ~80MB on first run)
         print("📥 Loading embedding model (all-MiniLM-L6-v2)...")
         self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        
+        # Inference only: optionally FP16 weights on GPU or INT8 on CPU
+        if self.model.device.type == "cuda":
+            if EMBEDDING_FP16:
+                self.model.half()
+        elif EMBEDDING_QUANTIZE:
+            import torch
+            self.model = torch.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
         print("✅ Embedding model loaded!")
     
     def chunk_text(self, text: str, max_length: int = 500, overlap: int = 50) -> List[str]:
@@ -30,24 +58,30 @@ class EmbeddingService:
         if not text or len(text) <= max_length:
             return [text] if text else []
         
+        # Find every sentence break once instead of rescanning each window with rfind
+        break_starts = []
+        break_ends = []
+        for match in _SENTENCE_BREAK_RE.finditer(text):
+            break_starts.append(match.start())
+            break_ends.append(match.end())
+        
         chunks = []
         start = 0
+        text_length = len(text)
         
-        while start < len(text):
+        while start < text_length:
             end = start + max_length
             
             # Try to break at sentence boundary for better coherence
-            if end < len(text):
-                chunk_text = text[start:end]
-                
-                # Look for sentence endings near the boundary
-                last_period = chunk_text.rfind('. ')
-                last_newline = chunk_text.rfind('\n')
-                break_point = max(last_period, last_newline)
-                
-                # Only break at sentence if it's not too far back
-                if break_point > max_length * 0.5:  # At least 50% of chunk
-                    end = start + break_point + 1
+            if end < text_length:
+                # Last break that fits entirely inside text[start:end]
+                i = bisect_right(break_ends, end) - 1
+                if i >= 0:
+                    break_point = break_starts[i] - start
+                    
+                    # Only break at sentence if it's not too far back
+                    if break_point > max_length * 0.5:  # At least 50% of chunk
+                        end = start + break_point + 1
             
             chunk = text[start:end].strip()
             if chunk:  # Only add non-empty chunks
@@ -57,7 +91,7 @@ class EmbeddingService:
         
         return chunks
     
-    def embed_text(self, text: str) -> List[float]:
+    def embed_text(self, text: str) -> np.ndarray:
         """
         Generate embedding for a single text.
         
@@ -65,16 +99,21 @@ class EmbeddingService:
             text: Text to embed
         
         Returns:
-            384-dimensional embedding vector
+            384-dimensional float32 embedding vector
         """
         if not text:
             # Return zero vector for empty text
-            return [0.0] * 384
+            return np.zeros(384, dtype=np.float32)
         
-        embedding = self.model.encode(text, convert_to_numpy=True)
-        return embedding.tolist()
+        return self.model.encode(text, convert_to_numpy=True)
+    
+    def embed_text_list(self, text: str) -> List[float]:
+        """
+        Same as embed_text, as a plain list for callers that need JSON-ready values.
+        """
+        return self.embed_text(text).tolist()
     
-    def embed_batch(self, texts: List[str], show_progress: bool = True) -> List[List[float]]:
+    def embed_batch(self, texts: List[str], show_progress: bool = True) -> np.ndarray:
         """
         Generate embeddings for multiple texts (faster than one-by-one).
         
@@ -83,20 +122,19 @@ class EmbeddingService:
             show_progress: Show progress bar
         
         Returns:
-            List of 384-dimensional embedding vectors
+            Array of shape (len(texts), 384)
         """
         if not texts:
-            return []
+            return np.empty((0, 384), dtype=np.float32)
         
         # Filter out empty texts
         valid_texts = [t if t else " " for t in texts]
         
-        embeddings = self.model.encode(
+        return self.model.encode(
             valid_texts, 
             convert_to_numpy=True, 
             show_progress_bar=show_progress
         )
-        return embeddings.tolist()
     
     def prepare_issue_for_embedding(self, issue: Dict) -> List[Dict]:
         """
@@ -138,6 +176,27 @@ class EmbeddingService:
         
         return results
     
+    def prepare_issues_for_embedding(self, issues: List[Dict], show_progress: bool = False) -> List[Dict]:
+        """
+        Chunk many issues and embed all of their chunks in one encode call.
+        
+        Args:
+            issues: Issue dictionaries, as for prepare_issue_for_embedding
+            show_progress: Show progress bar
+        
+        Returns:
+            Flat list of chunks, each with its vector under 'embedding'
+        """
+        items = [item for issue in issues for item in self.prepare_issue_for_embedding(issue)]
+        if not items:
+            return []
+        
+        embeddings = self.embed_batch([item['content'] for item in items], show_progress=show_progress)
+        for item, embedding in zip(items, embeddings):
+            item['embedding'] = embedding
+        
+        return items
+    
     def prepare_repository_for_embedding(self, repo: Dict) -> Dict:
         """
         Prepare a GitHub repository for embedding.
@@ -172,6 +231,7 @@ class EmbeddingService:
 
 # Global singleton instance
 _embedding_service = None
+_embedding_service_lock = threading.Lock()
 
 def get_embedding_service() -> EmbeddingService:
     """
@@ -180,5 +240,77 @@ def get_embedding_service() -> EmbeddingService:
     """
     global _embedding_service
     if _embedding_service is None:
-        _embedding_service = EmbeddingService()
-    return _embedding_service
\ No newline at end of file
+        # Concurrent first requests would otherwise each load their own model
+        with _embedding_service_lock:
+            if _embedding_service is None:
+                _embedding_service = EmbeddingService()
+    return _embedding_service
+
+class BatchedEmbedder:
+    """
+    Coalesces concurrent single-text embeds into one model batch.
+    Callers block on embed(); a background thread collects texts for up to
+    max_wait_ms (or until max_batch are queued) and encodes them together.
+    """
+    
+    def __init__(self, service: EmbeddingService, max_batch: int = EMBED_BATCH_MAX, max_wait_ms: float = EMBED_BATCH_WAIT_MS):
+        self._service = service
+        self._max_batch = max_batch
+        self._max_wait = max_wait_ms / 1000.0
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+    
+    def embed(self, text: str, timeout: float = None) -> np.ndarray:
+        """Embed one text as part of the next batch; same result as EmbeddingService.embed_text"""
+        if not text:
+            return np.zeros(384, dtype=np.float32)
+        
+        future = Future()
+        with self._cond:
+            # Started lazily so each forked worker process gets its own thread
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._worker.start()
+            self._pending.append((text, future))
+            self._cond.notify()
+        return future.result(timeout)
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                
+                # Give concurrent requests a short window to join this batch
+                deadline = time.monotonic() + self._max_wait
+                while len(self._pending) < self._max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                
+                batch = [self._pending.popleft() for _ in range(min(len(self._pending), self._max_batch))]
+            
+            try:
+                embeddings = self._service.embed_batch([text for text, _ in batch], show_progress=False)
+                for (_, future), embedding in zip(batch, embeddings):
+                    # Copy so a cached row doesn't pin the whole batch matrix
+                    future.set_result(embedding.copy())
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+_batched_embedder = None
+_batched_embedder_lock = threading.Lock()
+
+def get_batched_embedder() -> BatchedEmbedder:
+    """
+    Get or create the global batched embedder on top of the embedding service.
+    """
+    global _batched_embedder
+    if _batched_embedder is None:
+        with _batched_embedder_lock:
+            if _batched_embedder is None:
+                _batched_embedder = BatchedEmbedder(get_embedding_service())
+    return _batched_embedder
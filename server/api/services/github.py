@@ -1,20 +1,46 @@
 # server/api/services/github.py
 import os
+import threading
+import orjson
 import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 
 GITHUB_CLIENT_ID = os.getenv("GITHUB_CLIENT_ID")
 GITHUB_CLIENT_SECRET = os.getenv("GITHUB_CLIENT_SECRET")
 GITHUB_REDIRECT_URI = os.getenv("GITHUB_REDIRECT_URI", "http://localhost:5000/api/integrations/github/callback")
 GITHUB_API_BASE = "https://api.github.com"
 
+# One pooled keep-alive session for every GitHub call so TLS connections are reused.
+# Auth headers stay per request because the session is shared across users.
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+))
+
+# Upper bound on concurrent page fetches; stays within the adapter's pool size
+GITHUB_PAGE_WORKERS = 10
+
+# ETag cache for read endpoints: 304s skip the body and don't count against the rate limit.
+# Keyed by token too, since the same URL returns different data per user.
+GITHUB_ETAG_CACHE_SIZE = int(os.getenv("GITHUB_ETAG_CACHE_SIZE", "256"))
+_etag_cache = OrderedDict()
+_etag_lock = threading.Lock()
+
 
 class GitHubService:
     """Service for GitHub OAuth and API interactions"""
     
     def __init__(self, access_token: str = None):
         self.access_token = access_token
+        self.session = _session
         self.headers = {
             "Accept": "application/vnd.github.v3+json",
             "User-Agent": "Loominal-App"
@@ -40,7 +66,7 @@ class GitHubService:
     @staticmethod
     def exchange_code_for_token(code: str) -> Dict:
         """Exchange OAuth code for access token"""
-        response = requests.post(
+        response = _session.post(
             "https://github.com/login/oauth/access_token",
             data={
                 "client_id": GITHUB_CLIENT_ID,
@@ -52,70 +78,115 @@ class GitHubService:
             timeout=10
         )
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
     
     def get_user(self) -> Dict:
         """Get authenticated user info"""
-        response = requests.get(
-            f"{GITHUB_API_BASE}/user",
-            headers=self.headers,
-            timeout=10
-        )
-        response.raise_for_status()
-        return response.json()
+        return self._conditional_get(f"{GITHUB_API_BASE}/user", timeout=10)[0]
     
     def get_repositories(self, page: int = 1, per_page: int = 30) -> List[Dict]:
         """Get user's repositories"""
-        response = requests.get(
+        return self._conditional_get(
             f"{GITHUB_API_BASE}/user/repos",
-            headers=self.headers,
             params={
                 "page": page,
                 "per_page": per_page,
                 "sort": "updated",
                 "direction": "desc"
-            },
-            timeout=15
-        )
-        response.raise_for_status()
-        return response.json()
+            }
+        )[0]
     
     def get_repository(self, owner: str, repo: str) -> Dict:
         """Get single repository details"""
-        response = requests.get(
-            f"{GITHUB_API_BASE}/repos/{owner}/{repo}",
-            headers=self.headers,
-            timeout=10
-        )
-        response.raise_for_status()
-        return response.json()
+        return self._conditional_get(f"{GITHUB_API_BASE}/repos/{owner}/{repo}", timeout=10)[0]
     
     def get_issues(self, owner: str, repo: str, state: str = "all", page: int = 1, per_page: int = 30) -> List[Dict]:
         """Get repository issues"""
-        response = requests.get(
+        return self._conditional_get(
             f"{GITHUB_API_BASE}/repos/{owner}/{repo}/issues",
-            headers=self.headers,
             params={
                 "state": state,
                 "page": page,
                 "per_page": per_page,
                 "sort": "updated",
                 "direction": "desc"
-            },
-            timeout=15
+            }
+        )[0]
+    
+    def get_all_repositories(self, per_page: int = 100, max_pages: int = 10) -> List[Dict]:
+        """Get user's repositories across all pages"""
+        return self._get_all_pages(
+            f"{GITHUB_API_BASE}/user/repos",
+            {"per_page": per_page, "sort": "updated", "direction": "desc"},
+            max_pages
+        )
+    
+    def get_all_issues(self, owner: str, repo: str, state: str = "all", per_page: int = 100, max_pages: int = 10) -> List[Dict]:
+        """Get repository issues across all pages"""
+        return self._get_all_pages(
+            f"{GITHUB_API_BASE}/repos/{owner}/{repo}/issues",
+            {"state": state, "per_page": per_page, "sort": "updated", "direction": "desc"},
+            max_pages
         )
+    
+    def _get_all_pages(self, url: str, params: Dict, max_pages: int) -> List[Dict]:
+        """Fetch page 1, read the last page from its Link header, then fetch the rest concurrently"""
+        def fetch(page: int) -> Tuple[object, Dict]:
+            return self._conditional_get(url, params={**params, "page": page})
+        
+        items, links = fetch(1)
+        items = list(items)
+        
+        last_url = links.get("last", {}).get("url")
+        if not last_url:
+            return items
+        last_page = min(int(parse_qs(urlparse(last_url).query).get("page", ["1"])[0]), max_pages)
+        if last_page < 2:
+            return items
+        
+        with ThreadPoolExecutor(max_workers=min(GITHUB_PAGE_WORKERS, last_page - 1)) as executor:
+            # map() keeps page order
+            for page_items, _ in executor.map(fetch, range(2, last_page + 1)):
+                items.extend(page_items)
+        
+        return items
+    
+    def _conditional_get(self, url: str, params: Dict = None, timeout: int = 15) -> Tuple[object, Dict]:
+        """GET with If-None-Match from the ETag cache; returns (parsed body, Link header dict)"""
+        key = (self.access_token, url, tuple(sorted((params or {}).items())))
+        with _etag_lock:
+            cached = _etag_cache.get(key)
+            if cached:
+                _etag_cache.move_to_end(key)
+        
+        headers = self.headers
+        if cached:
+            headers = {**self.headers, "If-None-Match": cached[0]}
+        
+        response = self.session.get(url, headers=headers, params=params, timeout=timeout)
+        if response.status_code == 304 and cached:
+            return cached[1], cached[2]
         response.raise_for_status()
-        return response.json()
+        
+        data = orjson.loads(response.content)
+        etag = response.headers.get("ETag")
+        if etag:
+            with _etag_lock:
+                _etag_cache[key] = (etag, data, response.links)
+                _etag_cache.move_to_end(key)
+                while len(_etag_cache) > GITHUB_ETAG_CACHE_SIZE:
+                    _etag_cache.popitem(last=False)
+        return data, response.links
     
     def get_rate_limit(self) -> Dict:
         """Get API rate limit status"""
-        response = requests.get(
+        response = self.session.get(
             f"{GITHUB_API_BASE}/rate_limit",
             headers=self.headers,
             timeout=10
         )
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
 
 
 def parse_github_datetime(dt_str: str) -> Optional[datetime]:
@@ -1,8 +1,191 @@
 import os
-from sqlalchemy import create_engine, text
-from typing import List, Dict, Tuple
-from api.services.embedding_service import get_embedding_service
-import json
+import threading
+from functools import lru_cache
+import time
+import numpy as np
+from pgvector.psycopg2 import register_vector
+from sqlalchemy import create_engine, event, text
+from typing import List, Dict, Tuple, Optional
+from api.db import DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE
+from api.services.embedding_service import get_batched_embedder, get_embedding_service
+import orjson
+
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1024"))
+SEMANTIC_CACHE_TOLERANCE = float(os.getenv("SEMANTIC_CACHE_TOLERANCE", "0.02"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "300"))
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "4096"))
+VECTOR_STATEMENT_TIMEOUT_MS = int(os.getenv("VECTOR_STATEMENT_TIMEOUT_MS", "5000"))
+# HNSW candidate list size per search; higher = better recall, slower
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))
+# Search the FP16 copy from migrate_halfvec.py, then rerank candidates at full precision
+EMBEDDINGS_HALFVEC = os.getenv("EMBEDDINGS_HALFVEC", "false").lower() == "true"
+HALFVEC_CANDIDATE_FACTOR = 5
+
+# The threshold is applied after the index-ordered LIMIT, so chunks below
+# min_similarity are dropped in Postgres instead of being sent and discarded
+_FULL_PRECISION_SEARCH_SQL = text("""
+    SELECT content, source_type, source_id, metadata, similarity
+    FROM (
+        SELECT 
+            content,
+            source_type,
+            source_id,
+            metadata,
+            1 - (embedding <=> :query_embedding) as similarity
+        FROM embeddings
+        WHERE user_id = :user_id
+        ORDER BY embedding <=> :query_embedding
+        LIMIT :limit
+    ) nearest
+    WHERE similarity >= :min_similarity
+    ORDER BY similarity DESC
+""")
+
+# Stage 1 walks the smaller halfvec index; stage 2 reorders by exact FP32 distance
+_HALFVEC_SEARCH_SQL = text("""
+    SELECT content, source_type, source_id, metadata, similarity
+    FROM (
+        SELECT 
+            content,
+            source_type,
+            source_id,
+            metadata,
+            1 - (embedding <=> :query_embedding) as similarity
+        FROM embeddings
+        WHERE user_id = :user_id
+        ORDER BY embedding_half <=> CAST(:query_embedding AS halfvec(384))
+        LIMIT :candidates
+    ) candidates
+    WHERE similarity >= :min_similarity
+    ORDER BY similarity DESC
+    LIMIT :limit
+""")
+
+# One pooled engine for retrieval, built on first use instead of once per search
+_engine = None
+_engine_lock = threading.Lock()
+
+def _get_engine():
+    """Return the shared retrieval engine, creating it on first call"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(
+                    os.getenv("DATABASE_URL"),
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_pre_ping=True,
+                    # A runaway vector scan shouldn't hold a request forever
+                    connect_args={"options": f"-c statement_timeout={VECTOR_STATEMENT_TIMEOUT_MS}"}
+                )
+                # Let psycopg2 adapt float32 ndarrays to vector parameters directly
+                event.listen(engine, "connect", lambda dbapi_conn, _record: register_vector(dbapi_conn))
+                # Publish only once fully set up; readers check _engine without the lock
+                _engine = engine
+    return _engine
+
+class ProximityCache:
+    """
+    Process-local approximate cache of search results.
+    A lookup hits when a cached query embedding in the same scope is within
+    `tolerance` cosine distance of the new one. Entries expire after `ttl`
+    seconds so freshly synced embeddings show up; eviction is LRU.
+    """
+    
+    def __init__(self, capacity: int, tolerance: float, ttl: float):
+        self.capacity = capacity
+        self.tolerance = tolerance
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._vectors = None  # float32 [capacity, dim], allocated on first put
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._stored_at = np.zeros(capacity, dtype=np.float64)
+        self._results = [None] * capacity
+        self._scope_of = [None] * capacity
+        self._slots_by_scope = {}
+        self._size = 0
+    
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def get(self, scope: tuple, vector) -> Optional[List[Dict]]:
+        """Return cached results for a near-identical query in this scope, or None"""
+        if self.capacity <= 0:
+            return None
+        q = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            slots = self._slots_by_scope.get(scope)
+            if not slots:
+                return None
+            slot_idx = np.fromiter(slots, dtype=np.intp, count=len(slots))
+            similarities = self._vectors[slot_idx] @ q
+            # Expired entries can never hit
+            similarities[now - self._stored_at[slot_idx] > self.ttl] = -np.inf
+            best = int(np.argmax(similarities))
+            if 1.0 - similarities[best] > self.tolerance:
+                return None
+            slot = int(slot_idx[best])
+            self._last_used[slot] = now
+            return list(self._results[slot])
+    
+    def put(self, scope: tuple, vector, results: List[Dict]) -> None:
+        """Store results for this query embedding, evicting the least recently used entry"""
+        if self.capacity <= 0:
+            return
+        q = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, q.shape[0]), dtype=np.float32)
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._slots_by_scope[self._scope_of[slot]].discard(slot)
+            self._vectors[slot] = q
+            self._last_used[slot] = now
+            self._stored_at[slot] = now
+            self._results[slot] = list(results)
+            self._scope_of[slot] = scope
+            self._slots_by_scope.setdefault(scope, set()).add(slot)
+
+_search_cache = ProximityCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_TOLERANCE, SEMANTIC_CACHE_TTL)
+
+@lru_cache(maxsize=QUERY_EMBED_CACHE_SIZE)
+def _embed_query(query: str) -> np.ndarray:
+    """Embed query text, reusing the vector for exact repeats (read-only array)"""
+    # Concurrent requests share one model batch
+    vector = get_batched_embedder().embed(query)
+    vector.setflags(write=False)
+    return vector
+
+def _row_to_result(row, similarity: float) -> Dict:
+    """Shape a (content, source_type, source_id, metadata, ...) row as a search result"""
+    # metadata is JSONB, so psycopg2 already hands back a dict; only a
+    # legacy text value needs parsing
+    metadata_raw = row[3]
+    if isinstance(metadata_raw, (str, bytes)):
+        try:
+            metadata = orjson.loads(metadata_raw)
+        except orjson.JSONDecodeError:
+            metadata = {}
+    else:
+        metadata = metadata_raw or {}
+    
+    return {
+        'content': row[0],
+        'source_type': row[1],
+        'source_id': row[2],
+        'metadata': metadata,
+        'similarity': similarity
+    }
 
 def search_similar_embeddings(query: str, user_id: int, limit: int = 7, min_similarity: float = 0.3) -> List[Dict]:
     """
@@ -18,63 +201,149 @@ def search_similar_embeddings(query: str, user_id: int, limit: int = 7, min_simi
     Returns:
         List of similar chunks with metadata and similarity scores
     """
-    engine = create_engine(os.getenv("DATABASE_URL"))
-    embedding_service = get_embedding_service()
+    # Generate embedding for the query (exact repeats skip the model)
+    query_embedding = _embed_query(query)
     
-    # Generate embedding for the query
-    query_embedding = embedding_service.embed_text(query)
-    embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
+    # Paraphrased / repeated questions reuse an earlier result set
+    cache_scope = (user_id, limit, min_similarity)
+    cached = _search_cache.get(cache_scope, query_embedding)
+    if cached is not None:
+        return cached
     
-    with engine.connect() as conn:
+    with _get_engine().connect() as conn:
+        # Scoped to this transaction, so pooled connections keep the default
+        conn.execute(text(f"SET LOCAL hnsw.ef_search = {HNSW_EF_SEARCH}"))
+        
         # Vector similarity search using cosine distance
         # <=> is the cosine distance operator in pgvector
         # Lower distance = higher similarity
         # We convert to similarity score: 1 - distance
-        result = conn.execute(text("""
-            SELECT 
-                content,
-                source_type,
-                source_id,
-                metadata,
-                1 - (embedding <=> :query_embedding::vector) as similarity
-            FROM embeddings
-            WHERE metadata->>'user_id' = :user_id
-            ORDER BY embedding <=> :query_embedding::vector
-            LIMIT :limit
-        """), {
-            'query_embedding': embedding_str,
-            'user_id': str(user_id),
-            'limit': limit
-        })
+        result = conn.execute(
+            _HALFVEC_SEARCH_SQL if EMBEDDINGS_HALFVEC else _FULL_PRECISION_SEARCH_SQL,
+            {
+                'query_embedding': np.asarray(query_embedding, dtype=np.float32),
+                'user_id': int(user_id),
+                'limit': limit,
+                'candidates': limit * HALFVEC_CANDIDATE_FACTOR,
+                'min_similarity': min_similarity
+            }
+        )
         
-        results = []
-        for row in result:
-            similarity = float(row[4])
-            
-            # Skip if below threshold
-            if similarity < min_similarity:
-                continue
-            
-            # Parse metadata
-            metadata_raw = row[3]
-            if isinstance(metadata_raw, str):
-                try:
-                    metadata = json.loads(metadata_raw.replace("'", '"'))
-                except:
-                    metadata = {}
-            else:
-                metadata = metadata_raw or {}
-            
-            results.append({
-                'content': row[0],
-                'source_type': row[1],
-                'source_id': row[2],
-                'metadata': metadata,
-                'similarity': similarity
-            })
+        results = [_row_to_result(row, float(row[4])) for row in result]
         
+        _search_cache.put(cache_scope, query_embedding, results)
         return results
 
+def _batch_search_sql(query_count: int):
+    """One statement that runs the top-k search for every query vector via LATERAL"""
+    values = ", ".join(f"({i}, CAST(:q{i} AS vector))" for i in range(query_count))
+    if EMBEDDINGS_HALFVEC:
+        topk = """
+            SELECT content, source_type, source_id, metadata, similarity
+            FROM (
+                SELECT content, source_type, source_id, metadata,
+                       1 - (embedding <=> q.emb) AS similarity
+                FROM embeddings
+                WHERE user_id = :user_id
+                ORDER BY embedding_half <=> CAST(q.emb AS halfvec(384))
+                LIMIT :candidates
+            ) candidates
+            ORDER BY similarity DESC
+            LIMIT :limit"""
+    else:
+        topk = """
+            SELECT content, source_type, source_id, metadata,
+                   1 - (embedding <=> q.emb) AS similarity
+            FROM embeddings
+            WHERE user_id = :user_id
+            ORDER BY embedding <=> q.emb
+            LIMIT :limit"""
+    return text(f"""
+        WITH q(idx, emb) AS (VALUES {values})
+        SELECT e.content, e.source_type, e.source_id, e.metadata, e.similarity, q.idx
+        FROM q
+        CROSS JOIN LATERAL ({topk}
+        ) e
+        WHERE e.similarity >= :min_similarity
+        ORDER BY q.idx, e.similarity DESC
+    """)
+
+def search_similar_embeddings_batch(queries: List[str], user_id: int, limit: int = 7, min_similarity: float = 0.3) -> List[List[Dict]]:
+    """
+    Run search_similar_embeddings for many queries with one model call and one SQL round-trip.
+    
+    Args:
+        queries: User questions
+        user_id: User ID to scope the search
+        limit: Maximum number of results per query
+        min_similarity: Minimum similarity threshold (0-1)
+    
+    Returns:
+        One result list per query, in the same order as `queries`
+    """
+    if not queries:
+        return []
+    
+    embeddings = get_embedding_service().embed_batch(list(queries), show_progress=False)
+    
+    params = {
+        'user_id': int(user_id),
+        'limit': limit,
+        'candidates': limit * HALFVEC_CANDIDATE_FACTOR,
+        'min_similarity': min_similarity
+    }
+    for i, embedding in enumerate(embeddings):
+        params[f"q{i}"] = np.asarray(embedding, dtype=np.float32)
+    
+    results = [[] for _ in queries]
+    with _get_engine().connect() as conn:
+        conn.execute(text(f"SET LOCAL hnsw.ef_search = {HNSW_EF_SEARCH}"))
+        for row in conn.execute(_batch_search_sql(len(queries)), params):
+            results[row[5]].append(_row_to_result(row, float(row[4])))
+    
+    return results
+
+def _issue_source(metadata: Dict, similarity: float) -> Dict:
+    """Citation for an issue chunk"""
+    return {
+        'type': 'issue',
+        'title': metadata.get('title', 'GitHub Issue'),
+        'url': metadata.get('url', ''),
+        'metadata': {
+            'repository': metadata.get('repository', ''),
+            'state': metadata.get('state', ''),
+            'similarity': similarity
+        }
+    }
+
+def _repository_source(metadata: Dict, similarity: float) -> Dict:
+    """Citation for a repository"""
+    return {
+        'type': 'repository',
+        'title': metadata.get('name', 'GitHub Repository'),
+        'url': metadata.get('url', ''),
+        'metadata': {
+            'language': metadata.get('language', ''),
+            'stars': metadata.get('stars', 0),
+            'similarity': similarity
+        }
+    }
+
+# Citation builders per embeddings.source_type
+_SOURCE_BUILDERS = {
+    'issue': _issue_source,
+    'repository': _repository_source,
+}
+
+def _fragment_sort_key(result: Dict) -> tuple:
+    """Deterministic order for context fragments: source, then chunk position"""
+    return (
+        result['source_type'],
+        str(result['source_id']),
+        result['metadata'].get('chunk_index', 0),
+        result['content']
+    )
+
 def get_all_context(query: str, user_id: int) -> Tuple[str, List[Dict], int]:
     """
     Get all relevant context for a query using RAG.
@@ -96,53 +365,57 @@ def get_all_context(query: str, user_id: int) -> Tuple[str, List[Dict], int]:
     if not results:
         return "", [], 0
     
-    # Build context and sources
-    context_parts = []
-    sources = []
-    seen_sources = set()
+    # Fragments go in a fixed order rather than by score, so the same set of
+    # retrieved chunks always produces the same prompt bytes (and prefix cache hits)
+    ordered = sorted(results, key=_fragment_sort_key)
     
-    for i, result in enumerate(results, 1):
-        # Add to context with source reference
-        content = result['content']
-        context_parts.append(f"[Source {i}] {content}")
-        
-        # Build source citation (deduplicate by source_type + source_id)
-        metadata = result['metadata']
-        source_key = f"{result['source_type']}_{result['source_id']}"
-        
-        if source_key not in seen_sources:
-            seen_sources.add(source_key)
-            
-            if result['source_type'] == 'issue':
-                sources.append({
-                    'type': 'issue',
-                    'title': metadata.get('title', 'GitHub Issue'),
-                    'url': metadata.get('url', ''),
-                    'metadata': {
-                        'repository': metadata.get('repository', ''),
-                        'state': metadata.get('state', ''),
-                        'similarity': round(result['similarity'], 2)
-                    }
-                })
-            elif result['source_type'] == 'repository':
-                sources.append({
-                    'type': 'repository',
-                    'title': metadata.get('name', 'GitHub Repository'),
-                    'url': metadata.get('url', ''),
-                    'metadata': {
-                        'language': metadata.get('language', ''),
-                        'stars': metadata.get('stars', 0),
-                        'similarity': round(result['similarity'], 2)
-                    }
-                })
+    # Each source is cited with its best-scoring chunk's similarity
+    best_similarity = {}
+    for result in results:
+        key = (result['source_type'], result['source_id'])
+        best_similarity[key] = max(best_similarity.get(key, 0.0), result['similarity'])
+    
+    # Sources are numbered in fragment order, and every fragment carries its
+    # source's number, so [Source N] in the answer is always sources[N-1]
+    sources = []
+    source_numbers = {}
+    context_parts = []
+    for r in ordered:
+        key = (r['source_type'], r['source_id'])
+        if key not in source_numbers:
+            build = _SOURCE_BUILDERS.get(r['source_type'])
+            if build:
+                sources.append(build(r['metadata'], round(best_similarity[key], 2)))
+                source_numbers[key] = len(sources)
+            else:
+                source_numbers[key] = None
+        number = source_numbers[key]
+        id_attr = f' id="{number}"' if number else ''
+        context_parts.append(
+            f'<fragment{id_attr} source="{r["source_type"]}:{r["source_id"]}">\n{r["content"]}\n</fragment>'
+        )
     
     context_text = "\n\n".join(context_parts)
     return context_text, sources, len(sources)
 
+# Instruction prelude sent as the system message. It never changes between
+# requests, so providers with prefix caching reuse it across every RAG call.
+RAG_SYSTEM_PROMPT = """You are an AI assistant with access to the user's GitHub data. Answer the user's question using ONLY the provided context from their repositories and issues.
+
+The context is a list of <fragment id="N" source="type:id"> blocks. N is the source number; fragments from the same source share it.
+
+INSTRUCTIONS:
+1. Answer based ONLY on the provided context
+2. Always cite your sources using [Source 1], [Source 2], etc. (the fragment id N) when making claims
+3. If the context doesn't contain enough information to fully answer the question, acknowledge this
+4. Be concise but comprehensive
+5. When referencing specific issues or repositories, include their names
+6. If multiple sources say similar things, you can cite them all: [Source 1, 2, 3]"""
+
 def build_contextualized_prompt(query: str, context: str, sources_count: int) -> str:
     """
-    Build a prompt that includes retrieved context and instructs the LLM to cite sources.
-    This is optimized for Groq/Claude/GPT models.
+    Build the user message for a RAG call: retrieved context first, question last.
+    Pair it with RAG_SYSTEM_PROMPT as the system message.
     
     Args:
         query: User's question
@@ -150,24 +423,12 @@ def build_contextualized_prompt(query: str, context: str, sources_count: int) ->
         sources_count: Number of sources found
     
     Returns:
-        Formatted prompt for the LLM
+        Formatted user message for the LLM
     """
-    return f"""You are an AI assistant with access to the user's GitHub data. Answer the following question using ONLY the provided context from their repositories and issues.
-
-CONTEXT FROM GITHUB ({sources_count} sources):
+    return f"""CONTEXT FROM GITHUB ({sources_count} sources):
 {context}
 
-QUESTION: {query}
-
-INSTRUCTIONS:
-1. Answer based ONLY on the provided context above
-2. Always cite your sources using [Source 1], [Source 2], etc. when making claims
-3. If the context doesn't contain enough information to fully answer the question, acknowledge this
-4. Be concise but comprehensive
-5. When referencing specific issues or repositories, include their names
-6. If multiple sources say similar things, you can cite them all: [Source 1, 2, 3]
-
-ANSWER:"""
+QUESTION: {query}"""
 
 def extract_sources_list(sources: List[Dict]) -> str:
     """
@@ -179,7 +440,7 @@ def extract_sources_list(sources: List[Dict]) -> str:
     Returns:
         JSON string
     """
-    return json.dumps(sources)
+    return orjson.dumps(sources).decode()
 
 # Legacy functions (for backward compatibility)
 # These can be removed once you confirm RAG is working
@@ -188,72 +449,55 @@ def search_github_issues(query: str, user_id: int, limit: int = 5) -> List[Dict]
     """
     DEPRECATED: Legacy keyword search for issues.
     Use search_similar_embeddings() instead for semantic search.
+    Matching runs in Postgres against the GIN-indexed issues.search_tsv.
     """
-    from api.db import Issue
-    from sqlalchemy.orm import sessionmaker
-    
-    engine = create_engine(os.getenv("DATABASE_URL"))
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    
-    keywords = query.lower().split()
-    issues = session.query(Issue).filter_by(user_id=user_id).all()
-    
-    relevant_issues = []
-    for issue in issues:
-        title_lower = (issue.title or "").lower()
-        body_lower = (issue.body or "")[:500].lower()
+    with _get_engine().connect() as conn:
+        rows = conn.execute(text("""
+            SELECT i.title, left(i.body, 200), i.url, r.name, i.state,
+                   ts_rank_cd(i.search_tsv, q) AS rank
+            FROM issues i
+            JOIN repositories r ON r.id = i.repository_id
+            JOIN integrations g ON g.id = r.integration_id,
+                 plainto_tsquery('english', :query) q
+            WHERE g.user_id = :user_id AND i.search_tsv @@ q
+            ORDER BY rank DESC
+            LIMIT :limit
+        """), {'query': query, 'user_id': user_id, 'limit': limit})
         
-        match_count = sum(1 for kw in keywords if kw in title_lower or kw in body_lower)
-        if match_count > 0:
-            relevant_issues.append({
-                'type': 'issue',
-                'title': issue.title,
-                'body': (issue.body or "")[:200],
-                'url': issue.url,
-                'repository': issue.repository_name,
-                'state': issue.state,
-                'relevance': match_count
-            })
-    
-    relevant_issues.sort(key=lambda x: x['relevance'], reverse=True)
-    session.close()
-    
-    return relevant_issues[:limit]
+        return [{
+            'type': 'issue',
+            'title': row[0],
+            'body': row[1] or "",
+            'url': row[2],
+            'repository': row[3],
+            'state': row[4],
+            'relevance': float(row[5])
+        } for row in rows]
 
 def search_github_repositories(query: str, user_id: int, limit: int = 3) -> List[Dict]:
     """
     DEPRECATED: Legacy keyword search for repositories.
     Use search_similar_embeddings() instead for semantic search.
+    Matching runs in Postgres against the GIN-indexed repositories.search_tsv.
     """
-    from api.db import Repository
-    from sqlalchemy.orm import sessionmaker
-    
-    engine = create_engine(os.getenv("DATABASE_URL"))
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    
-    keywords = query.lower().split()
-    repos = session.query(Repository).filter_by(user_id=user_id).all()
-    
-    relevant_repos = []
-    for repo in repos:
-        name_lower = (repo.name or "").lower()
-        desc_lower = (repo.description or "").lower()
+    with _get_engine().connect() as conn:
+        rows = conn.execute(text("""
+            SELECT r.name, r.description, r.url, r.language, r.stars_count,
+                   ts_rank_cd(r.search_tsv, q) AS rank
+            FROM repositories r
+            JOIN integrations g ON g.id = r.integration_id,
+                 plainto_tsquery('english', :query) q
+            WHERE g.user_id = :user_id AND r.search_tsv @@ q
+            ORDER BY rank DESC
+            LIMIT :limit
+        """), {'query': query, 'user_id': user_id, 'limit': limit})
         
-        match_count = sum(1 for kw in keywords if kw in name_lower or kw in desc_lower)
-        if match_count > 0:
-            relevant_repos.append({
-                'type': 'repository',
-                'name': repo.name,
-                'description': repo.description,
-                'url': repo.url,
-                'language': repo.language,
-                'stars': repo.stars,
-                'relevance': match_count
-            })
-    
-    relevant_repos.sort(key=lambda x: x['relevance'], reverse=True)
-    session.close()
-    
-    return relevant_repos[:limit]
\ No newline at end of file
+        return [{
+            'type': 'repository',
+            'name': row[0],
+            'description': row[1],
+            'url': row[2],
+            'language': row[3],
+            'stars': row[4],
+            'relevance': float(row[5])
+        } for row in rows]
@@ -1,4 +1,6 @@
 # server/api/utils/__init__.py
-from .helpers import requires_auth_conditional
+from .helpers import requires_auth_conditional, read_json, start_stream
+from .json_provider import OrjsonProvider
+from .http_cache import fingerprint_etag, with_cache_headers, not_modified
 
-__all__ = ['requires_auth_conditional']
\ No newline at end of file
+__all__ = ['requires_auth_conditional', 'read_json', 'start_stream', 'OrjsonProvider', 'fingerprint_etag', 'with_cache_headers', 'not_modified']
@@ -0,0 +1,54 @@
+# server/api/utils/add_embeddings_user_id.py
+import os
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# 1) Load server/.env
+BASE_DIR = Path(__file__).resolve().parents[2]
+env_path = BASE_DIR / ".env"
+
+print(f"Loading .env from: {env_path}")
+load_dotenv(dotenv_path=env_path)
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+if not DATABASE_URL:
+    raise RuntimeError(f"DATABASE_URL is not set. Check {env_path}")
+
+print(f"Using DATABASE_URL = {DATABASE_URL}")
+
+engine = create_engine(DATABASE_URL)
+
+# 2) Promote metadata->>'user_id' to a typed, indexed column
+with engine.connect() as conn:
+    result = conn.execute(
+        text("SELECT column_name FROM information_schema.columns WHERE table_name = 'embeddings';")
+    )
+    existing_columns = {row[0] for row in result}
+
+    if "user_id" not in existing_columns:
+        print("Adding user_id column to embeddings...")
+        conn.execute(text("ALTER TABLE embeddings ADD COLUMN user_id BIGINT;"))
+        conn.commit()
+        print("✅ Added column: user_id")
+    else:
+        print("Column already exists: user_id")
+
+    print("Backfilling user_id from metadata...")
+    result = conn.execute(text(
+        "UPDATE embeddings SET user_id = (metadata->>'user_id')::bigint "
+        "WHERE user_id IS NULL AND metadata->>'user_id' ~ '^[0-9]+$';"
+    ))
+    conn.commit()
+    print(f"✅ Backfilled {result.rowcount} rows")
+
+# 3) Index the column and drop the JSON expression index it replaces
+with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+    print("Creating index on embeddings(user_id)...")
+    conn.execute(text("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_embeddings_user_id ON embeddings(user_id);"))
+    conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS idx_embeddings_user;"))
+    print("✅ Index ready")
+
+print("Done adding embeddings.user_id.")
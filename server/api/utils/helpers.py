@@ -1,7 +1,9 @@
 # server/api/utils/helpers.py
 import os
 from functools import wraps
+import orjson
 from flask import request, jsonify
+from werkzeug.exceptions import BadRequest
 from api.auth import requires_auth
 
 AUTH0_ENABLED = os.getenv("AUTH0_ENABLED", "false").lower() == "true"
@@ -14,4 +16,34 @@ def requires_auth_conditional(f):
         @wraps(f)
         def decorated(*args, **kwargs):
             return f(*args, **kwargs)
-        return decorated
\ No newline at end of file
+        return decorated
+
+def read_json() -> dict:
+    """
+    Parse the request body with orjson; an empty body gives {}.
+    Reads the raw bytes without Werkzeug caching a second copy, so call it once per request.
+    """
+    raw = request.get_data(cache=False)
+    if not raw:
+        return {}
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
+        raise BadRequest("Invalid JSON body") from e
+
+def start_stream(gen):
+    """
+    Run a response generator up to its first chunk now, so errors raised before
+    any output reach the route (and become a proper error status) instead of
+    truncating a 200 body. Returns an iterator over the full output.
+    """
+    head = next(gen)
+    
+    def resume():
+        try:
+            yield head
+            yield from gen
+        finally:
+            gen.close()
+    
+    return resume()
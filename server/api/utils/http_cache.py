@@ -0,0 +1,22 @@
+# server/api/utils/http_cache.py
+import hashlib
+from flask import current_app, request
+
+# Responses vary per user, so shared caches must not store them
+CACHE_CONTROL = "private, must-revalidate"
+
+def fingerprint_etag(*parts) -> str:
+    """Hash the parts of a change fingerprint into a short ETag value"""
+    return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=8).hexdigest()
+
+def with_cache_headers(response, etag: str):
+    """Attach the ETag and revalidation policy to a list response"""
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+def not_modified(etag: str):
+    """Return a 304 response if the client already holds this ETag, else None"""
+    if request.if_none_match.contains(etag):
+        return with_cache_headers(current_app.response_class(status=304), etag)
+    return None
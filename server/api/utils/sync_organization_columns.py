@@ -23,36 +23,28 @@ engine = create_engine(DATABASE_URL)
 
 # 2) Define the columns we expect on organizations table
 REQUIRED_COLUMNS = {
-    "logo_url": "ALTER TABLE organizations ADD COLUMN logo_url VARCHAR(512);",
-    "website": "ALTER TABLE organizations ADD COLUMN website VARCHAR(255);",
-    "is_personal": "ALTER TABLE organizations ADD COLUMN is_personal BOOLEAN DEFAULT FALSE;",
-    "is_active": "ALTER TABLE organizations ADD COLUMN is_active BOOLEAN DEFAULT TRUE;",
-    "max_members": "ALTER TABLE organizations ADD COLUMN max_members INTEGER DEFAULT 50;",
-    "plan_type": "ALTER TABLE organizations ADD COLUMN plan_type VARCHAR(50) DEFAULT 'free';",
-    "billing_email": "ALTER TABLE organizations ADD COLUMN billing_email VARCHAR(255);",
-    "updated_at": "ALTER TABLE organizations ADD COLUMN updated_at TIMESTAMP;"
+    "logo_url": "VARCHAR(512)",
+    "website": "VARCHAR(255)",
+    "is_personal": "BOOLEAN DEFAULT FALSE",
+    "is_active": "BOOLEAN DEFAULT TRUE",
+    "max_members": "INTEGER DEFAULT 50",
+    "plan_type": "VARCHAR(50) DEFAULT 'free'",
+    "billing_email": "VARCHAR(255)",
+    "updated_at": "TIMESTAMP"
 }
 
-with engine.connect() as conn:
-    # 3) Find existing columns
-    result = conn.execute(
-        text("SELECT column_name FROM information_schema.columns WHERE table_name = 'organizations';")
-    )
-    existing_columns = {row[0] for row in result}
-
-    print("Existing columns on organizations:", existing_columns)
-
-    # 4) Add any missing columns
-    for col, alter_sql in REQUIRED_COLUMNS.items():
-        if col not in existing_columns:
-            print(f"Adding missing column: {col}")
-            try:
-                conn.execute(text(alter_sql))
-                conn.commit()
-                print(f"✅ Added column: {col}")
-            except Exception as e:
-                print(f"⚠️ Error while adding column {col}: {e}")
-        else:
-            print(f"Column already exists: {col}")
-
-    print("Done syncing organization columns.")
+# 3) Add any missing columns in one ALTER: IF NOT EXISTS makes an
+# information_schema probe unnecessary, and one transaction means all
+# columns land together (or none do) with a single commit
+alter_sql = "ALTER TABLE organizations " + ", ".join(
+    f"ADD COLUMN IF NOT EXISTS {col} {spec}" for col, spec in REQUIRED_COLUMNS.items()
+) + ";"
+
+try:
+    with engine.begin() as conn:
+        conn.execute(text(alter_sql))
+    print(f"✅ Ensured columns: {', '.join(REQUIRED_COLUMNS)}")
+except Exception as e:
+    print(f"⚠️ Error while adding organization columns: {e}")
+
+print("Done syncing organization columns.")
@@ -1,11 +1,13 @@
 # server/app.py
 import os
+import orjson
 from flask import Flask, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 
-from api.db import init_db
+from api.db import init_db, close_request_session
 from api.routes import register_routes
+from api.utils import OrjsonProvider
 
 load_dotenv()
 
@@ -22,6 +24,7 @@ UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
 MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000") 
 
@@ -36,7 +39,7 @@ if DEBUG:
                 FRONTEND_URL
             ],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization", "X-Organization-Id"],
+            "allow_headers": ["Content-Type", "Authorization", "X-Organization-Id", "X-Filename"],
             "expose_headers": ["Content-Type", "Authorization"],
             "supports_credentials": True,
             "max_age": 3600
@@ -47,7 +50,7 @@ else:
         r"/*": {
             "origins": [FRONTEND_URL],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization", "X-Organization-Id"],
+            "allow_headers": ["Content-Type", "Authorization", "X-Organization-Id", "X-Filename"],
             "expose_headers": ["Content-Type", "Authorization"],
             "supports_credentials": True,
             "max_age": 3600
@@ -55,6 +58,9 @@ else:
     })
 
 app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE
+# Behind Apache mod_xsendfile (or lighttpd), send_file only sets X-Sendfile and the
+# server streams the file; nginx deployments use USE_X_ACCEL in the uploads routes instead
+app.config['USE_X_SENDFILE'] = os.getenv("USE_X_SENDFILE", "false").lower() == "true"
 
 if DEBUG:
     app.config['JSON_SORT_KEYS'] = False
@@ -67,35 +73,58 @@ init_db(DATABASE_URL)
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 register_routes(app)
+app.teardown_appcontext(close_request_session)
+
+# Load the embedding model at startup so the first RAG query doesn't pay for it
+if os.getenv("EMBEDDINGS_PRELOAD", "false").lower() == "true":
+    from api.services.embedding_service import get_batched_embedder
+    get_batched_embedder()
+
+# Everything /health reports is fixed once init_db has run, so the body is
+# encoded once; checking SessionLocal also avoids opening (and leaking) a
+# session on every probe
+from api.db import SessionLocal
+_HEALTH_BODY = orjson.dumps({
+    "status": "ok",
+    "auth_enabled": AUTH0_ENABLED,
+    "domain": AUTH0_DOMAIN,
+    "audience": AUTH0_AUDIENCE,
+    "database_connected": SessionLocal is not None
+})
 
 @app.route("/health")
 def health():
-    from api.db import get_session
-    return jsonify({
-        "status": "ok",
-        "auth_enabled": AUTH0_ENABLED,
-        "domain": AUTH0_DOMAIN,
-        "audience": AUTH0_AUDIENCE,
-        "database_connected": get_session() is not None
-    })
+    return app.response_class(_HEALTH_BODY, mimetype="application/json")
+
+# Error bodies are encoded once; each call still gets its own Response because
+# after_request hooks (flask_cors) set per-request headers on it
+_ERROR_BODIES = {
+    401: orjson.dumps({"error": "Unauthorized"}),
+    404: orjson.dumps({"error": "Not found"}),
+    413: orjson.dumps({"error": "File too large"}),
+    500: orjson.dumps({"error": "Internal server error"}),
+}
+
+def _error_response(status):
+    return app.response_class(_ERROR_BODIES[status], status=status, mimetype="application/json")
 
 @app.errorhandler(401)
 def unauthorized(e):
-    return jsonify({"error": "Unauthorized"}), 401
+    return _error_response(401)
 
 @app.errorhandler(404)
 def not_found(e):
-    return jsonify({"error": "Not found"}), 404
+    return _error_response(404)
 
 @app.errorhandler(500)
 def server_error(e):
     if DEBUG:
         return jsonify({"error": "Internal server error", "details": str(e)}), 500
-    return jsonify({"error": "Internal server error"}), 500
+    return _error_response(500)
 
 @app.errorhandler(413)
 def file_too_large(e):
-    return jsonify({"error": "File too large"}), 413
+    return _error_response(413)
 
 if not DEBUG:
     import atexit
@@ -0,0 +1,26 @@
+# server/gunicorn.conf.py
+# Usage: gunicorn -c gunicorn.conf.py app:app
+import os
+import multiprocessing
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Routes spend most of their time waiting on the database or the AI provider,
+# so threaded workers let each process keep several requests in flight.
+# GUNICORN_WORKER_CLASS=gevent multiplexes far more waiting requests per process
+# (needs `pip install gevent psycogreen`); keep gthread if RAG embeds run in-process,
+# since model inference holds the CPU and would stall every greenlet in the worker.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = 5
+
+
+def post_fork(server, worker):
+    """gunicorn's gevent worker patches the stdlib; psycopg2 is C and needs its own wait callback"""
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
@@ -34,6 +34,7 @@ def migrate_embeddings():
                 source_type VARCHAR(50) NOT NULL,  -- 'issue', 'repository', 'pr'
                 source_id INTEGER NOT NULL,
                 source_metadata JSONB,
+                user_id BIGINT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
         """))
@@ -43,10 +44,10 @@ def migrate_embeddings():
         # Create vector similarity index for fast searches
         print("🔍 Creating vector similarity index...")
         conn.execute(text("""
-            CREATE INDEX IF NOT EXISTS embeddings_vector_idx 
+            CREATE INDEX IF NOT EXISTS embeddings_hnsw_idx 
             ON embeddings 
-            USING ivfflat (embedding vector_cosine_ops)
-            WITH (lists = 100);
+            USING hnsw (embedding vector_cosine_ops)
+            WITH (m = 16, ef_construction = 200);
         """))
         conn.commit()
         print("✅ Vector index created")
@@ -60,6 +61,15 @@ def migrate_embeddings():
         conn.commit()
         print("✅ Source index created")
         
+        # Create user lookup index (search is always scoped to one user)
+        print("🔍 Creating user index...")
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_embeddings_user_id 
+            ON embeddings(user_id);
+        """))
+        conn.commit()
+        print("✅ User index created")
+        
         # Check table status
         result = conn.execute(text("SELECT COUNT(*) FROM embeddings"))
         count = result.scalar()
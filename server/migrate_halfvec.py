@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Migration script to add a half-precision copy of each embedding for search.
+Adds a generated embeddings.embedding_half halfvec column (kept in sync by
+Postgres) and an HNSW index on it. Requires pgvector >= 0.7.
+Once done, set EMBEDDINGS_HALFVEC=true to search through it.
+Run: python migrate_halfvec.py
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STATEMENTS = {
+    "embedding_half column": (
+        "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS embedding_half halfvec(384) "
+        "GENERATED ALWAYS AS (embedding::halfvec(384)) STORED"
+    ),
+    "embeddings_half_hnsw_idx": (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS embeddings_half_hnsw_idx ON embeddings "
+        "USING hnsw (embedding_half halfvec_cosine_ops) WITH (m = 16, ef_construction = 200)"
+    ),
+}
+
+def run_migration():
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found")
+        return False
+    
+    print("🚀 Starting Halfvec Migration...")
+    
+    try:
+        engine = create_engine(DATABASE_URL)
+        
+        # CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for name, sql in STATEMENTS.items():
+                print(f"Running {name}...")
+                conn.execute(text(sql))
+                print(f"✅ {name} done")
+        
+        print("\n🎉 Migration completed! Set EMBEDDINGS_HALFVEC=true to use it.")
+        return True
+        
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    print("Loominal Halfvec Migration")
+    print("==========================")
+    success = run_migration()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Migration script to add indexes for the hot organization, query, upload and
+template filters. New databases get these from init_db(); run this once on
+existing ones. Indexes are built CONCURRENTLY so live tables stay writable.
+Run: python migrate_indexes.py
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# organizations.slug is already covered by its UNIQUE constraint
+INDEXES = {
+    "ix_memb_user_active": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_memb_user_active ON user_organization_memberships(user_id) WHERE is_active",
+    "ix_memb_org_active": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_memb_org_active ON user_organization_memberships(organization_id) WHERE is_active",
+    "ix_invite_org_email_status": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_invite_org_email_status ON organization_invitations(organization_id, email, status)",
+    "ix_queries_org_created": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_queries_org_created ON queries(organization_id, created_at DESC, id DESC)",
+    "ix_queries_user_created": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_queries_user_created ON queries(user_id, created_at DESC, id DESC)",
+    "ix_uploads_user_created": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_uploads_user_created ON uploaded_files(user_id, created_at DESC)",
+    "ix_uploads_org_created": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_uploads_org_created ON uploaded_files(organization_id, created_at DESC)",
+    "ix_templates_user_created": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_templates_user_created ON templates(user_id, created_at DESC)",
+    "ix_templates_org_created": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_templates_org_created ON templates(organization_id, created_at DESC)",
+    "ix_templates_public_created": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_templates_public_created ON templates(created_at DESC) WHERE is_public",
+}
+
+def run_migration():
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found")
+        return False
+    
+    print("🚀 Starting Index Migration...")
+    
+    try:
+        engine = create_engine(DATABASE_URL)
+        
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for name, sql in INDEXES.items():
+                print(f"Creating {name}...")
+                conn.execute(text(sql))
+                print(f"✅ {name} ready")
+        
+        print("\n🎉 Migration completed!")
+        return True
+        
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    print("Loominal Index Migration")
+    print("========================")
+    success = run_migration()
+    sys.exit(0 if success else 1)
@@ -110,6 +110,22 @@ def run_migration():
         else:
             print("ℹ️  issues table already exists")
         
+        # Full-text search columns for the keyword fallback in knowledge_retrieval
+        print("Adding full-text search columns...")
+        search_columns = [
+            ("issues.search_tsv", """
+                ALTER TABLE issues ADD COLUMN IF NOT EXISTS search_tsv tsvector
+                GENERATED ALWAYS AS (to_tsvector('english', coalesce(title, '') || ' ' || coalesce(body, ''))) STORED
+            """),
+            ("repositories.search_tsv", """
+                ALTER TABLE repositories ADD COLUMN IF NOT EXISTS search_tsv tsvector
+                GENERATED ALWAYS AS (to_tsvector('english', coalesce(name, '') || ' ' || coalesce(description, ''))) STORED
+            """),
+        ]
+        for name, sql in search_columns:
+            session.execute(text(sql))
+            print(f"✅ {name} ready")
+        
         # Create indexes
         print("Creating indexes...")
         
@@ -121,6 +137,8 @@ def run_migration():
             ("idx_issues_repository", "CREATE INDEX IF NOT EXISTS idx_issues_repository ON issues(repository_id)"),
             ("idx_issues_github_id", "CREATE INDEX IF NOT EXISTS idx_issues_github_id ON issues(github_id)"),
             ("idx_issues_state", "CREATE INDEX IF NOT EXISTS idx_issues_state ON issues(state)"),
+            ("idx_issues_search", "CREATE INDEX IF NOT EXISTS idx_issues_search ON issues USING gin(search_tsv)"),
+            ("idx_repositories_search", "CREATE INDEX IF NOT EXISTS idx_repositories_search ON repositories USING gin(search_tsv)"),
         ]
         
         for name, sql in indexes:
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Migration script to switch embeddings search to an HNSW index.
+Replaces the ivfflat index from migrate_embeddings.py, built CONCURRENTLY so
+the table stays writable. The user filter is indexed by
+api/utils/add_embeddings_user_id.py.
+Run: python migrate_vector_index.py
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STATEMENTS = {
+    "embeddings_hnsw_idx": (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS embeddings_hnsw_idx ON embeddings "
+        "USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 200)"
+    ),
+    "drop embeddings_vector_idx": "DROP INDEX CONCURRENTLY IF EXISTS embeddings_vector_idx",
+}
+
+def run_migration():
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found")
+        return False
+    
+    print("🚀 Starting Vector Index Migration...")
+    
+    try:
+        engine = create_engine(DATABASE_URL)
+        
+        # CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for name, sql in STATEMENTS.items():
+                print(f"Running {name}...")
+                conn.execute(text(sql))
+                print(f"✅ {name} done")
+        
+        print("\n🎉 Migration completed!")
+        return True
+        
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    print("Loominal Vector Index Migration")
+    print("===============================")
+    success = run_migration()
+    sys.exit(0 if success else 1)
@@ -48,17 +48,17 @@ def sync_embeddings(user_id: int):
     print(f"\n🗑️  Clearing old embeddings...")
     with engine.connect() as conn:
         result = conn.execute(
-            text("DELETE FROM embeddings WHERE metadata->>'user_id' = :uid"), 
-            {"uid": str(user_id)}
+            text("DELETE FROM embeddings WHERE user_id = :uid"), 
+            {"uid": user_id}
         )
         conn.commit()
         print(f"   Deleted {result.rowcount} old embeddings")
     
-    # Process issues (with chunking)
+    # Process issues (chunked and embedded in one batch)
     print(f"\n📝 Processing issues...")
-    all_chunks = []
-    for i, issue in enumerate(issues, 1):
-        issue_dict = {
+    print(f"   This may take a minute...")
+    issue_dicts = [
+        {
             'id': issue.id,
             'title': issue.title,
             'body': issue.body,
@@ -66,16 +66,13 @@ def sync_embeddings(user_id: int):
             'state': issue.state,
             'url': issue.url
         }
-        chunks = embedding_service.prepare_issue_for_embedding(issue_dict)
-        
-        # Add user_id to metadata
-        for chunk in chunks:
-            chunk['metadata']['user_id'] = user_id
-        
-        all_chunks.extend(chunks)
-        
-        if i % 10 == 0:
-            print(f"   Processed {i}/{len(issues)} issues...")
+        for issue in issues
+    ]
+    all_chunks = embedding_service.prepare_issues_for_embedding(issue_dicts, show_progress=True)
+    
+    # Add user_id to metadata
+    for chunk in all_chunks:
+        chunk['metadata']['user_id'] = user_id
     
     print(f"   ✅ Created {len(all_chunks)} chunks from {len(issues)} issues")
     
@@ -95,6 +92,11 @@ def sync_embeddings(user_id: int):
         item['metadata']['user_id'] = user_id
         repo_items.append(item)
     
+    if repo_items:
+        repo_embeddings = embedding_service.embed_batch([item['content'] for item in repo_items], show_progress=True)
+        for item, embedding in zip(repo_items, repo_embeddings):
+            item['embedding'] = embedding
+    
     print(f"   ✅ Prepared {len(repo_items)} repositories")
     
     # Combine all items
@@ -106,32 +108,26 @@ def sync_embeddings(user_id: int):
         session.close()
         return
     
-    print(f"\n🧠 Generating embeddings for {total_items} items...")
-    print(f"   This may take a minute...")
-    
-    # Generate embeddings in batch (much faster than one-by-one)
-    texts = [item['content'] for item in all_items]
-    embeddings = embedding_service.embed_batch(texts, show_progress=True)
-    
     # Insert into database
     print(f"\n💾 Saving to database...")
     with engine.connect() as conn:
-        for i, (item, embedding) in enumerate(zip(all_items, embeddings), 1):
-            # Convert embedding list to pgvector format
-            embedding_str = '[' + ','.join(map(str, embedding)) + ']'
+        for i, item in enumerate(all_items, 1):
+            # Convert embedding to pgvector format
+            embedding_str = '[' + ','.join(map(str, item['embedding'])) + ']'
             
             # Convert metadata to proper JSON string
             metadata_json = json.dumps(item['metadata'])
             
             conn.execute(text("""
-                INSERT INTO embeddings (content, embedding, source_type, source_id, metadata)
-                VALUES (:content, :embedding::vector, :source_type, :source_id, :metadata::jsonb)
+                INSERT INTO embeddings (content, embedding, source_type, source_id, metadata, user_id)
+                VALUES (:content, :embedding::vector, :source_type, :source_id, :metadata::jsonb, :user_id)
             """), {
                 'content': item['content'],
                 'embedding': embedding_str,
                 'source_type': item['source_type'],
                 'source_id': item['source_id'],
-                'metadata': metadata_json
+                'metadata': metadata_json,
+                'user_id': user_id
             })
             
             if i % 50 == 0: